@@ -1,104 +1,342 @@
 import cv2
-import asyncio
+import numpy as np
+import os
 import time
-from pupil_apriltags import Detector
 
+import detector_registry
+from apriltag_backends import BACKENDS, resolve_backend
 from base_mode import BaseCameraMode
+from calibration import CALIBRATION_PATH, load_calibration
+from result_protocol import KIND_TAG, MODE_IDS, Target
+from capture_profile import CaptureProfile
+from frame_context import FrameContext
+from tracking import TagTracker
 
 
 SEND_ZMQ_INTERVAL = 0.5  # sekundy – posíláme jen jednou za 0.5s
 
+# --------------------------------------------------------------
+#  ADAPTIVNÍ quad_decimate
+#   velké (blízké) tagy → vyšší decimace, malé (vzdálené) → nižší;
+#   když detekce nestíhá TARGET_FRAME_MS, decimace se zvedne
+# --------------------------------------------------------------
+DECIMATE_LEVELS = (1.0, 1.5, 2.0, 3.0, 4.0)
+DEFAULT_DECIMATE = 2.0
+MIN_TAG_SIDE_PX = 24        # nejkratší strana tagu po decimaci, kterou ještě chceme
+TARGET_FRAME_MS = 25.0      # ~40 fps na detekci
+APRILTAG_THREADS = None     # None = všechna volná jádra
+LOG_INTERVAL = 5.0          # s
+FULL_SCAN_EVERY = 15        # snímků mezi plnými skeny při sledování tagů
+
+# póza (solvePnP) jen pro ID z pose_ids v calibration.json – bez něj se nepočítá;
+# calibration.example.json je jen šablona s odhadnutými hodnotami
+POSE_ENABLED = True
+
+# "pupil" | "aruco" | "auto" = podle bench_apriltag.py --write
+APRILTAG_BACKEND = "auto"
+
+def _create_detector(backend, quad_decimate, nthreads):
+    return BACKENDS[backend](quad_decimate, nthreads)
+
+
+# detektory se vytváří líně přes registr – jednou na proces a kombinaci parametrů
+# (hlavní proces i každý VisionPool worker má vlastní)
+detector_registry.register("apriltag", _create_detector)
+
+
+def _get_detector(backend="pupil", quad_decimate=DEFAULT_DECIMATE, nthreads=1):
+    return detector_registry.get(
+        "apriltag", backend=backend, quad_decimate=float(quad_decimate), nthreads=int(nthreads)
+    )
+
+
+def _tag_dict(t, ox=0, oy=0):
+    tag_id, family, center, corners = t
+    return {
+        "id": tag_id,
+        "family": family,
+        "center": [float(center[0] + ox), float(center[1] + oy)],
+        "corners": (np.asarray(corners) + (ox, oy)).tolist(),
+    }
+
+
+def detect(frame, quad_decimate=DEFAULT_DECIMATE, nthreads=1, rois=None, pose=False,
+           backend="pupil"):
+    """
+    Čistá detekce AprilTagů – vrací seznam tagů jako dicty.
+    rois = [(x0, y0, x1, y1), ...] → detekce jen ve výřezech, souřadnice v celém snímku.
+    pose = True → tagy z whitelistu kalibrace dostanou "pose" (t, rvec, distance, yaw).
+    """
+    # ---- grayscale pro apriltagy (sdílený přes FrameContext) ----
+    gray = FrameContext.wrap(frame).gray
+    detector = _get_detector(backend, quad_decimate, nthreads)
+
+    # ---- detekce ----
+    t0 = time.perf_counter()
+    if rois is None:
+        tags = [_tag_dict(t) for t in detector.detect(gray)]
+    else:
+        tags = []
+        for x0, y0, x1, y1 in rois:
+            # detektor chce souvislé pole, výřez je jen view
+            crop = np.ascontiguousarray(gray[y0:y1, x0:x1])
+            tags += [_tag_dict(t, x0, y0) for t in detector.detect(crop)]
+
+    # ---- póza – ostatní tagy nestojí nic ----
+    calib = load_calibration(gray.shape[1], gray.shape[0]) if pose else None
+    for t in tags:
+        t["pose"] = None
+        if calib is not None and t["id"] in calib.pose_ids:
+            t["pose"] = calib.pose(t["corners"])
+    detect_ms = (time.perf_counter() - t0) * 1000.0
+
+    return {
+        "backend": backend,
+        "quad_decimate": float(quad_decimate),
+        "nthreads": int(nthreads),
+        "detect_ms": detect_ms,
+        "rois": rois,
+        "tags": tags,
+    }
+
+
+def min_tag_side(tags):
+    """Nejkratší strana nejmenšího tagu v px (None bez tagů)."""
+    sides = []
+    for t in tags:
+        c = np.asarray(t["corners"], np.float32)
+        sides.append(np.linalg.norm(c - np.roll(c, 1, axis=0), axis=1).min())
+    return float(min(sides)) if sides else None
+
+
+class DecimateController:
+    """
+    Volí quad_decimate podle velikosti tagů z minulých snímků a času detekce.
+    Výběr je index do DECIMATE_LEVELS; měnit se smí nejvýš o jeden krok za HOLD snímků.
+    """
+
+    HOLD = 5
+
+    def __init__(self, target_ms=TARGET_FRAME_MS, levels=DECIMATE_LEVELS):
+        self.levels = levels
+        self.target_ms = target_ms
+        self.index = levels.index(DEFAULT_DECIMATE)
+        self.floor = 0              # minimum, které si vynutil čas detekce
+        self.detect_ms = 0.0        # EWMA plných skenů na aktuální úrovni
+        self.fresh = True           # na aktuální úrovni ještě nebyl plný sken
+        self.since_change = 0
+
+    @property
+    def quad_decimate(self):
+        return self.levels[self.index]
+
+    def _wanted_by_size(self, side):
+        # bez tagů hledáme daleko → plné rozlišení
+        if side is None:
+            return 0
+        wanted = 0
+        for i, d in enumerate(self.levels):
+            if side / d >= MIN_TAG_SIDE_PX:
+                wanted = i
+        return wanted
+
+    def update(self, result):
+        ms = result.get("detect_ms")
+        if ms is None or result.get("quad_decimate") != self.quad_decimate:
+            return
+        self.since_change += 1
+
+        # čas jen z plných skenů – výřezy jsou vždy rychlé a rozpočet by zkreslily
+        if result.get("rois") is None:
+            self.detect_ms = ms if self.fresh else self.detect_ms * 0.8 + ms * 0.2
+            self.fresh = False
+
+        if self.since_change < self.HOLD:
+            return
+
+        # časový rozpočet – hystereze, ať se neskáče tam a zpět
+        if not self.fresh:
+            if self.detect_ms > self.target_ms:
+                self.floor = min(self.index + 1, len(self.levels) - 1)
+            elif self.detect_ms < self.target_ms * 0.5 and self.floor > 0:
+                self.floor -= 1
+
+        wanted = max(self._wanted_by_size(min_tag_side(result["tags"])), self.floor)
+        if wanted != self.index:
+            self.index += 1 if wanted > self.index else -1
+            self.since_change = 0
+            self.fresh = True
+
+
+def free_cores(manager):
+    """Jádra, která nezabírá grab vlákno, event loop ani VisionPool."""
+    pool = getattr(manager, "pool", None)
+    busy = 1 + (pool.workers if pool is not None else 0)
+    return max(1, (os.cpu_count() or 1) - busy)
+
+
+def detector_threads(manager):
+    # ve VisionPool workerech víc vláken jen přetíží CPU
+    if getattr(manager, "pool", None) is not None:
+        return 1
+    return min(APRILTAG_THREADS or os.cpu_count() or 1, free_cores(manager))
+
+
+# vyšší rozlišení = tagy i z dálky
+CAPTURE_PROFILE = CaptureProfile(width=1280, height=720, fps=30, buffersize=1)
+
 
 class AprilTag(BaseCameraMode):
     name = "APRILTAG"
+    mode_id = MODE_IDS["APRILTAG"]
+    detect_fn = staticmethod(detect)
+    capture_profile = CAPTURE_PROFILE
+
+    def __init__(self, manager):
+        super().__init__(manager)
+        self.decimate = DecimateController()
+        self.tracker = TagTracker(full_scan_every=FULL_SCAN_EVERY)
+        self.last_log = 0.0
+        self.detections = 0
+
+        self.nthreads = detector_threads(manager)
+        self.backend = resolve_backend(APRILTAG_BACKEND, self.log)
+
+    @staticmethod
+    def prewarm_specs(manager):
+        return [("apriltag", {
+            "backend": resolve_backend(APRILTAG_BACKEND),
+            "quad_decimate": float(DEFAULT_DECIMATE),
+            "nthreads": detector_threads(manager),
+        })]
 
     async def start(self):
-        self.detector = Detector(
-            families='tag36h11',
-            nthreads=1,
-            quad_decimate=2.0,
-            quad_sigma=0.0,
-            refine_edges=True
-        )
+        self.last_zmq_send = 0   # čas posledního ZMQ eventu
         await super().start()
 
-    async def loop(self):
-        self.log.info("AprilTag detection running")
+    async def _init_camera(self):
+        ok = await super()._init_camera()
+        if not (ok and POSE_ENABLED):
+            return ok
+        if not os.path.exists(CALIBRATION_PATH):
+            self.log.warn(
+                "calibration.json nenalezen – posílám jen offsety bez pózy "
+                "(šablona: calibration.example.json)"
+            )
+        else:
+            # vadný soubor zaloguje a zacachuje load_calibration – mód běží dál bez pózy
+            load_calibration(self.frame_w, self.frame_h, log=self.log)
+        return ok
+
+    def detect_params(self):
+        return {
+            "backend": self.backend,
+            "quad_decimate": self.decimate.quad_decimate,
+            "nthreads": self.nthreads,
+            # po nalezení tagů jen výřezy kolem nich, občas celý snímek
+            "rois": self.tracker.search_windows(self.frame_w, self.frame_h),
+            "pose": POSE_ENABLED,
+        }
 
+    def _log_tuning(self, result):
+        self.detections += 1
+        now = time.monotonic()
+        if now - self.last_log < LOG_INTERVAL:
+            return
+        if self.last_log:
+            fps = self.detections / (now - self.last_log)
+            self.log.info(
+                f"backend={result.get('backend')} "
+                f"quad_decimate={result.get('quad_decimate')} nthreads={result.get('nthreads')} "
+                f"detect={self.decimate.detect_ms:.1f} ms fps={fps:.1f}"
+            )
+        self.last_log = now
+        self.detections = 0
+
+    def has_target(self):
+        return self.tracker.active
+
+    def targets(self, result):
         cx = self.frame_w // 2
         cy = self.frame_h // 2
+        targets = []
+
+        for t in sorted(result["tags"], key=lambda t: t.get("pose") is None):
+            tx, ty = t["center"]
+            side = min_tag_side([t])
+            pose = t.get("pose")
+
+            # bez pózy: distance = -1, translace a yaw nuly
+            extra = {}
+            if pose:
+                px, py, pz = pose["t"]
+                extra = {"distance": pose["distance"], "tx": px, "ty": py, "tz": pz, "yaw": pose["yaw"]}
+
+            targets.append(Target(
+                KIND_TAG, t["id"], tx - cx, ty - cy,
+                size=side, area=side * side, score=1.0, **extra,
+            ))
+        return targets
+
+    def observe(self, result, ts):
+        self.tracker.update(result["tags"], result.get("rois"))
+        self.decimate.update(result)
+        self._log_tuning(result)
+
+    async def publish(self, job):
+        self.observe(job.result, job.ts)
+
+        cx = self.frame_w // 2
+        cy = self.frame_h // 2
+
+        # věci pro display
+        display_tags = []
+
+        for t in job.result["tags"]:
+            tx, ty = t["center"]
+
+            display_tags.append({
+                "id": t["id"],
+                "family": t["family"],
+                "center": [tx, ty],
+                "offset": [tx - cx, ty - cy],
+                "corners": t["corners"],
+                "pose": t.get("pose"),
+            })
+
+        # UDP → RoboRIO (vždy) – všechny tagy, s pózou první
+        await self.send_result(job, self.targets(job.result))
+
+        # ZMQ → DISPLAY (jen 1× za 0.5s)
+        now = time.time()
+        if now - self.last_zmq_send >= SEND_ZMQ_INTERVAL:
+            if getattr(self.manager, "bus", None) is not None:
+                await self.manager.bus.send_apriltag(display_tags)
+            self.last_zmq_send = now
+
+    def annotate(self, frame, result):
+        debug = frame.copy()
+
+        # výřezy sledování
+        for x0, y0, x1, y1 in result.get("rois") or ():
+            cv2.rectangle(debug, (x0, y0), (x1, y1), (255, 200, 0), 1)
+
+        for t in result["tags"]:
+            tx, ty = t["center"]
+
+            pts = np.int32(t["corners"])
+            cv2.polylines(debug, [pts], True, (0, 255, 0), 2)
+            cv2.circle(debug, (int(tx), int(ty)), 5, (0, 255, 0), -1)
+
+            label = f"id={t['id']}"
+            if t.get("pose"):
+                label += f" {t['pose']['distance']:.2f} m"
+
+            cv2.putText(debug,
+                        label,
+                        (int(tx) + 10, int(ty) - 10),
+                        cv2.FONT_HERSHEY_SIMPLEX,
+                        0.5, (0, 255, 0), 1)
 
-        last_zmq_send = 0   # čas posledního ZMQ eventu
-
-        while self.running:
-            ok, frame = self.cap.read()
-            if not ok:
-                await asyncio.sleep(0)
-                continue
-
-            # ---- grayscale pro apriltagy ----
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-
-            # ---- detekce ----
-            tags = self.detector.detect(gray, estimate_tag_pose=False)
-
-            debug = frame.copy()
-
-            # výchozí hodnoty
-            offset_x = -1.0
-            offset_y = -1.0
-            tag_id = -1.0
-
-            # věci pro display
-            display_tags = []
-
-            for t in tags:
-
-                tx = float(t.center[0])
-                ty = float(t.center[1])
-                dx = tx - cx
-                dy = ty - cy
-
-                pts = t.corners.astype(int)
-                cv2.polylines(debug, [pts], True, (0, 255, 0), 2)
-                cv2.circle(debug, (int(tx), int(ty)), 5, (0, 255, 0), -1)
-
-                cv2.putText(debug,
-                            f"id={t.tag_id}",
-                            (int(tx) + 10, int(ty) - 10),
-                            cv2.FONT_HERSHEY_SIMPLEX,
-                            0.5, (0, 255, 0), 1)
-
-                display_tags.append({
-                    "id": int(t.tag_id),
-                    "family": (
-                        t.tag_family.decode("utf-8") 
-                        if isinstance(t.tag_family, bytes) 
-                        else t.tag_family
-                    ),
-                    "center": [tx, ty],
-                    "offset": [dx, dy],
-                    "corners": t.corners.tolist(),
-                })
-
-            # UDP → RoboRIO (vždy)
-            if display_tags:
-                first = display_tags[0]
-                offset_x = float(first["offset"][0])
-                offset_y = float(first["offset"][1])
-                tag_id = float(first["id"])
-
-            await self.send_data(offset_x, offset_y, tag_id)
-
-            # ZMQ → DISPLAY (jen 1× za 0.5s)
-            now = time.time()
-            if now - last_zmq_send >= SEND_ZMQ_INTERVAL:
-                if getattr(self.manager, "bus", None) is not None:
-                    await self.manager.bus.send_apriltag(display_tags)
-                last_zmq_send = now
-
-            # preview → DisplayManager
-            preview = cv2.resize(debug, (self.frame_w, self.frame_h))
-            await self.send_preview(preview)
-
-            await asyncio.sleep(0)
+        # preview → DisplayManager
+        return debug
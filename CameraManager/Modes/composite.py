@@ -0,0 +1,104 @@
+import time
+
+from base_mode import BaseCameraMode
+from capture_profile import CaptureProfile
+from frame_context import FrameContext
+from result_protocol import MODE_IDS
+
+from Modes.detect_ball import DetectBall
+from Modes.apriltag import AprilTag
+from Modes.detect_qrcode import QRCodeMode
+
+
+SEND_ZMQ_INTERVAL = 0.5   # s
+
+# pevné pořadí – určuje i pořadí záznamů v UDP paketu
+MODES = {
+    DetectBall.name: DetectBall,
+    AprilTag.name: AprilTag,
+    QRCodeMode.name: QRCodeMode,
+}
+
+CAPTURE_PROFILE = CaptureProfile(width=640, height=480, fps=30, buffersize=1)
+
+
+def detect(frame, detectors=(), params=None):
+    """Všechny detektory nad jedním snímkem – gray/HSV/zmenšeniny se spočítají jednou."""
+    ctx = FrameContext.wrap(frame)
+    params = params or {}
+    return {
+        name: MODES[name].detect_fn(ctx, **params.get(name, {}))
+        for name in detectors
+    }
+
+
+class CompositeMode(BaseCameraMode):
+    """Víc detektorů najednou, např. SET MODE DETECTBALL+APRILTAG."""
+
+    detect_fn = staticmethod(detect)
+    capture_profile = CAPTURE_PROFILE
+    mode_id = MODE_IDS["COMPOSITE"]
+
+    def __init__(self, manager, detectors):
+        self.detectors = [name for name in MODES if name in detectors]
+        self.name = "+".join(self.detectors)
+        super().__init__(manager)
+
+        # dílčí módy – jejich detect_params(), observe(), targets() a annotate()
+        self.parts = {name: MODES[name](manager) for name in self.detectors}
+
+    async def start(self):
+        self.last_zmq_send = 0.0
+        await super().start()
+
+    async def _init_camera(self):
+        ok = await super()._init_camera()
+        for part in self.parts.values():
+            part.frame_w = self.frame_w
+            part.frame_h = self.frame_h
+        return ok
+
+    def detect_params(self):
+        return {
+            "detectors": self.detectors,
+            "params": {name: part.detect_params() for name, part in self.parts.items()},
+        }
+
+    # ---------------------------------------------------------
+    #  JEDEN VÝSLEDNÝ PAKET – záznamy všech detektorů v pořadí MODES
+    # ---------------------------------------------------------
+    def has_target(self):
+        return any(part.has_target() for part in self.parts.values())
+
+    def targets(self, results):
+        targets = []
+        for name in self.detectors:
+            targets += self.parts[name].targets(results[name])
+        return targets
+
+    async def publish(self, job):
+        results = job.result
+        # trackery dílčích módů – jinak has_target() i rychlosti zůstanou prázdné
+        for name in self.detectors:
+            self.parts[name].observe(results[name], job.ts)
+
+        # UDP → RoboRIO: jeden paket, záznamy rozliší pole kind
+        await self.send_result(job, self.targets(results))
+
+        now = time.time()
+        if now - self.last_zmq_send >= SEND_ZMQ_INTERVAL:
+            if getattr(self.manager, "bus", None) is not None:
+                await self.manager.bus.send_composite({
+                    name: {k: v for k, v in res.items() if k != "mask"}
+                    for name, res in results.items()
+                })
+            self.last_zmq_send = now
+
+    def annotate(self, frame, result):
+        # DetectBall přidává masku vedle snímku, proto kreslí poslední
+        image = frame
+        for name in reversed(self.detectors):
+            drawn = self.parts[name].annotate(image, result[name])
+            if drawn is not None:
+                image = drawn
+        return image
@@ -1,9 +1,13 @@
 import cv2
 import numpy as np
-import asyncio
 import time
 
 from base_mode import BaseCameraMode
+from capture_profile import CaptureProfile
+from frame_context import FrameContext
+from tracking import BallTracker
+from color_lut import ColorLUT
+from result_protocol import KIND_BALL, MODE_IDS, Target
 
 
 SEND_INTERVAL_MS = 10
@@ -18,122 +22,373 @@ MIN_CIRCULARITY = 0.30
 HSV_LOWER = np.array([160, 120, 120])
 HSV_UPPER = np.array([180, 255, 255])
 
+# segmentace: "hsv" = cvtColor + inRange, "lut" = předpočítaná BGR tabulka
+# (co je na Pi rychlejší, ukáže bench_segment.py)
+SEGMENTER = "hsv"
+LUT_BITS = 6
 
-class DetectBall(BaseCameraMode):
-    name = "DETECTBALL"
-
-    async def loop(self):
-        self.log.info("DetectBall running")
-
-        cx = self.frame_w // 2
-        cy = self.frame_h // 2
-
-        last_send = 0
-
-        while self.running:
-
-            ok, frame = self.cap.read()
-            if not ok:
-                await asyncio.sleep(0)
-                continue
-
-            hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
-
-            # ---------------------------------------------------------
-            #   MASKA – ultra čistá verze
-            # ---------------------------------------------------------
-            mask = cv2.inRange(hsv, HSV_LOWER, HSV_UPPER)
-            mask = cv2.GaussianBlur(mask, (MASK_BLUR, MASK_BLUR), 0)
-
-            # odstranění šumu
-            mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, KERNEL)
-            mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, KERNEL)
-
-            # odlesky / ruce → jemný erode
-            mask = cv2.erode(mask, np.ones((3,3), np.uint8))
-
-            # ---------------------------------------------------------
-            #  KONTURY – najdeme JEDEN největší blob
-            # ---------------------------------------------------------
-            contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-
-            best = None
-            best_score = 0
-
-            for c in contours:
-                area = cv2.contourArea(c)
-                if area < MIN_AREA:
-                    continue
+_lut = ColorLUT(bits=LUT_BITS)
+
+
+# detekční profily: level = na kolikrát zmenšeném snímku (2^level) se čistí maska
+# a hledají kandidáti; poloha a kružnice se pak zpřesní na výřezu v plném rozlišení
+DETECT_PROFILES = {
+    "accurate": {"level": 0},
+    "fast": {"level": 1},
+    "fastest": {"level": 2},
+}
+DETECT_PROFILE = "accurate"
 
-                # kruhovitost
-                per = cv2.arcLength(c, True)
-                if per == 0:
-                    continue
+REFINE_PAD = 2           # px zmenšeného snímku kolem kandidáta
+
+# hledání kandidátů: "components" = connectedComponentsWithStats + numpy,
+# "contours" = původní smyčka přes findContours
+CANDIDATES = "components"
+TOP_K = 3
+
+
+def segment(ctx, roi=None, level=0):
+    """
+    Binární maska barvy míče pro celý snímek nebo výřez.
+    Při level > 0 je maska (i roi) v souřadnicích zmenšeného snímku.
+    """
+    if level == 0:
+        if SEGMENTER == "lut":
+            bgr = ctx.frame if roi is None else ctx.frame[roi[1]:roi[3], roi[0]:roi[2]]
+            return _lut.mask(bgr, HSV_LOWER, HSV_UPPER)
+
+        hsv = ctx.hsv if roi is None else ctx.hsv_roi(*roi)
+        return cv2.inRange(hsv, HSV_LOWER, HSV_UPPER)
+
+    bgr = ctx.pyr(level)
+    if roi is not None:
+        bgr = bgr[roi[1]:roi[3], roi[0]:roi[2]]
+    if SEGMENTER == "lut":
+        return _lut.mask(bgr, HSV_LOWER, HSV_UPPER)
+    return cv2.inRange(cv2.cvtColor(bgr, cv2.COLOR_BGR2HSV), HSV_LOWER, HSV_UPPER)
+
+
+def _odd(n):
+    return max(3, int(n) | 1)
+
+
+def clean_mask(mask, level=0):
+    """Blur + close/open + erode; jádra se zmenšují s úrovní pyramidy."""
+    s = 1 << level
+    blur = _odd(MASK_BLUR / s)
+    kernel = np.ones((_odd(KERNEL.shape[0] / s),) * 2, np.uint8)
+
+    mask = cv2.GaussianBlur(mask, (blur, blur), 0)
+
+    # odstranění šumu
+    mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, kernel)
+    mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, kernel)
+
+    # odlesky / ruce → jemný erode (na zmenšenině by sežral celý okraj)
+    if level == 0:
+        mask = cv2.erode(mask, np.ones((3,3), np.uint8))
+    return mask
+
+
+def _candidate(x, y, circle, area, score, bbox):
+    return {
+        "x": int(x),
+        "y": int(y),
+        "circle": [float(circle[0]), float(circle[1]), float(circle[2])],
+        "area": float(area),
+        "score": float(score),
+        "bbox": tuple(int(v) for v in bbox),
+    }
+
+
+def candidates_contours(mask, min_area, offset=(0, 0), top_k=TOP_K):
+    """Původní smyčka přes kontury – přesná kruhovitost, ale drahá při mnoha blobech."""
+    contours, _ = cv2.findContours(
+        mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE, offset=offset
+    )
+
+    found = []
+    for c in contours:
+        area = cv2.contourArea(c)
+        if area < min_area:
+            continue
+
+        # kruhovitost
+        per = cv2.arcLength(c, True)
+        if per == 0:
+            continue
+
+        circularity = 4 * np.pi * (area / (per * per))
+        if circularity < MIN_CIRCULARITY:
+            continue
+
+        M = cv2.moments(c)
+        if M["m00"] <= 0:
+            continue
+
+        # score = kruhovitost x plocha
+        (ex, ey), r = cv2.minEnclosingCircle(c)
+        found.append(_candidate(
+            M["m10"] / M["m00"], M["m01"] / M["m00"], (ex, ey, r),
+            area, circularity * area, cv2.boundingRect(c),
+        ))
+
+    found.sort(key=lambda b: b["score"], reverse=True)
+    return found[:top_k]
+
+
+def candidates_components(mask, min_area, offset=(0, 0), top_k=TOP_K):
+    """
+    Všechny bloby najednou z connectedComponentsWithStats – filtr i pořadí jsou
+    numpy operace nad poli, v Pythonu se iteruje jen přes top_k výsledků.
+    """
+    n, _, stats, centroids = cv2.connectedComponentsWithStats(mask, connectivity=8)
+    if n <= 1:
+        return []
+
+    # label 0 = pozadí
+    stats = stats[1:]
+    centroids = centroids[1:]
+
+    area = stats[:, cv2.CC_STAT_AREA].astype(np.float32)
+    w = stats[:, cv2.CC_STAT_WIDTH].astype(np.float32)
+    h = stats[:, cv2.CC_STAT_HEIGHT].astype(np.float32)
+
+    # odhad kruhovitosti bez obvodu: poměr stran x zaplnění bounding boxu
+    # vůči plnému kruhu (π/4) – kruh = 1, čtverec = π/4 jako u 4πA/P²
+    aspect = np.minimum(w, h) / np.maximum(w, h)
+    fill = area / (w * h)
+    circularity = aspect * np.minimum(fill, (np.pi / 4) ** 2 / fill) / (np.pi / 4)
+    score = circularity * area
+
+    keep = np.flatnonzero((area >= min_area) & (circularity >= MIN_CIRCULARITY))
+    if keep.size == 0:
+        return []
+    keep = keep[np.argsort(-score[keep])[:top_k]]
+
+    ox, oy = offset
+    found = []
+    for i in keep:
+        x, y, bw, bh = stats[i, :4]
+        found.append(_candidate(
+            centroids[i, 0] + ox, centroids[i, 1] + oy,
+            (x + ox + bw / 2.0, y + oy + bh / 2.0, max(bw, bh) / 2.0),
+            area[i], score[i], (x + ox, y + oy, bw, bh),
+        ))
+    return found
+
+
+CANDIDATE_ENGINES = {
+    "contours": candidates_contours,
+    "components": candidates_components,
+}
+
+
+def refine(ctx, cand, level):
+    """
+    Kandidát ze zmenšeniny → těžiště a kružnice z výřezu v plném rozlišení.
+    Když se ve výřezu nic nenajde, vrátí kandidáta jen přeškálovaného.
+    """
+    s = 1 << level
+    h, w = ctx.shape[:2]
+    bx, by, bw, bh = cand["bbox"]
+
+    px0 = max(0, (bx - REFINE_PAD) * s)
+    py0 = max(0, (by - REFINE_PAD) * s)
+    px1 = min(w, (bx + bw + REFINE_PAD) * s)
+    py1 = min(h, (by + bh + REFINE_PAD) * s)
+
+    patch = segment(ctx, (px0, py0, px1, py1))
+    patch = cv2.morphologyEx(patch, cv2.MORPH_OPEN, np.ones((3,3), np.uint8))
+
+    contours, _ = cv2.findContours(
+        patch, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE, offset=(px0, py0)
+    )
+    area_scale = s * s
+    if contours:
+        c = max(contours, key=cv2.contourArea)
+        M = cv2.moments(c)
+        if M["m00"] > 0:
+            (ex, ey), r = cv2.minEnclosingCircle(c)
+            return _candidate(
+                M["m10"] / M["m00"], M["m01"] / M["m00"], (ex, ey, r),
+                M["m00"], cand["score"] * area_scale, cv2.boundingRect(c),
+            )
+
+    ex, ey, r = cand["circle"]
+    return _candidate(
+        cand["x"] * s, cand["y"] * s, (ex * s, ey * s, r * s),
+        cand["area"] * area_scale, cand["score"] * area_scale,
+        tuple(v * s for v in cand["bbox"]),
+    )
+
+
+def _scaled_roi(roi, level, shape):
+    s = 1 << level
+    x0, y0, x1, y1 = roi
+    h, w = shape[:2]
+    return x0 // s, y0 // s, min(w, -(-x1 // s)), min(h, -(-y1 // s))
+
+
+def detect(frame, with_mask=True, roi=None, level=0, top_k=TOP_K):
+    """
+    Čistá detekce míče – běží v hlavním procesu i ve VisionPool workeru.
+    roi = (x0, y0, x1, y1) → zpracuje se jen výřez, souřadnice jsou ale vždy v celém snímku.
+    level > 0 → maska a kandidáti na zmenšenině 2^level, zpřesnění v plném rozlišení.
+    Vrací až top_k míčů seřazených podle skóre; "ball" je ten nejlepší.
+    """
+    ctx = FrameContext.wrap(frame)
+    s = 1 << level
+
+    # okno v souřadnicích úrovně, na které se maska počítá
+    if roi is None:
+        sroi = None
+        x0 = y0 = 0
+    else:
+        sroi = roi if level == 0 else _scaled_roi(roi, level, ctx.pyr(level).shape)
+        x0, y0, x1, y1 = sroi
+
+    # ---------------------------------------------------------
+    #   MASKA – ultra čistá verze
+    # ---------------------------------------------------------
+    mask = clean_mask(segment(ctx, sroi, level), level)
+
+    # ---------------------------------------------------------
+    #  KANDIDÁTI – seřazení podle skóre (kruhovitost x plocha)
+    # ---------------------------------------------------------
+    balls = CANDIDATE_ENGINES[CANDIDATES](mask, MIN_AREA / (s * s), (x0, y0), top_k)
+    if level > 0:
+        balls = [refine(ctx, b, level) for b in balls]
+    for b in balls:
+        del b["bbox"]
+
+    # masku vracíme jen pro preview – z VisionPool workeru by se zbytečně picklovala
+    if not with_mask:
+        mask = None
+    else:
+        if roi is not None:
+            full = np.zeros(ctx.pyr(level).shape[:2], np.uint8)
+            full[y0:y1, x0:x1] = mask
+            mask = full
+        if level > 0:
+            h, w = ctx.shape[:2]
+            mask = cv2.resize(mask, (w, h), interpolation=cv2.INTER_NEAREST)
+
+    return {"ball": balls[0] if balls else None, "balls": balls, "mask": mask, "roi": roi}
+
+
+# 640x480 kvůli MIN_AREA, vysoké fps a 1 buffer = co nejmenší zpoždění
+CAPTURE_PROFILE = CaptureProfile(width=640, height=480, fps=60, buffersize=1)
 
-                circularity = 4 * np.pi * (area / (per * per))
-                if circularity < MIN_CIRCULARITY:
-                    continue
 
-                # score = kruhovitost x plocha
-                score = circularity * area
-
-                if score > best_score:
-                    best_score = score
-                    best = c
-
-            debug = frame.copy()
-
-            # ---------------------------------------------------------
-            #  VÝSTUP
-            # ---------------------------------------------------------
-            rel_x = -1
-            rel_y = -1
-            ball_detected = False
-
-            if best is not None:
-                M = cv2.moments(best)
-                if M["m00"] > 0:
-                    bx = int(M["m10"] / M["m00"])
-                    by = int(M["m01"] / M["m00"])
-
-                    rel_x = bx - cx
-                    rel_y = by - cy
-                    ball_detected = True
-
-                    (cx2, cy2), r = cv2.minEnclosingCircle(best)
-                    cv2.circle(debug, (int(cx2), int(cy2)), int(r), (0, 255, 0), 2)
-                    cv2.circle(debug, (bx, by), 6, (0, 255, 0), -1)
-
-                    cv2.putText(
-                        debug, f"X={rel_x} Y={rel_y}",
-                        (bx + 10, by),
-                        cv2.FONT_HERSHEY_SIMPLEX,
-                        0.7,
-                        (0, 255, 0), 2
-                    )
-
-            # ---------------------------------------------------------
-            #  PREVIEW — BEZ JEDINÉ ZMĚNY (NEŠAHÁM NA TO!)
-            # ---------------------------------------------------------
-            mask_color = cv2.cvtColor(mask, cv2.COLOR_GRAY2BGR)
-            side = np.hstack((debug, mask_color))
-
-            preview = cv2.resize(side, (self.frame_w, self.frame_h))
-            await self.send_preview(preview)
-
-            # ---------------------------------------------------------
-            # POSÍLÁNÍ DAT
-            # ---------------------------------------------------------
-            now = time.time() * 1000
-            if now - last_send > SEND_INTERVAL_MS:
-
-                await self.send_data(rel_x, rel_y)
-
-                if getattr(self.manager, "bus", None) is not None:
-                    await self.manager.bus.send_detect_ball(
-                        rel_x, rel_y, ball_detected
-                    )
-
-                last_send = now
-
-            await asyncio.sleep(0)
+class DetectBall(BaseCameraMode):
+    name = "DETECTBALL"
+    mode_id = MODE_IDS["DETECTBALL"]
+    detect_fn = staticmethod(detect)
+    capture_profile = CAPTURE_PROFILE
+
+    def __init__(self, manager):
+        super().__init__(manager)
+        self.last_send = 0
+        self.tracker = BallTracker()
+
+    def detect_params(self):
+        return {
+            "with_mask": self.preview_demand() is not None,
+            # po nalezení míče jen okno kolem predikce, jinak celý snímek
+            "roi": self.tracker.search_window(time.monotonic(), self.frame_w, self.frame_h),
+            **DETECT_PROFILES[DETECT_PROFILE],
+        }
+
+    def has_target(self):
+        return self.tracker.active
+
+    def _relative(self, ball):
+        if ball is None:
+            return -1, -1
+        return ball["x"] - self.frame_w // 2, ball["y"] - self.frame_h // 2
+
+    def _records(self, balls):
+        records = []
+        for b in balls:
+            rel_x, rel_y = self._relative(b)
+            records.append((rel_x, rel_y, b["circle"][2], b["area"], b["score"]))
+        return records
+
+    def targets(self, result):
+        # rychlost má jen sledovaný (nejlepší) míč
+        vx, vy = self.tracker.velocity
+        targets = []
+        for i, (rel_x, rel_y, r, area, score) in enumerate(self._records(result["balls"])):
+            targets.append(Target(
+                KIND_BALL, i, rel_x, rel_y,
+                vx=vx if i == 0 else 0.0, vy=vy if i == 0 else 0.0,
+                size=r, area=area, score=score,
+            ))
+        return targets
+
+    def observe(self, result, ts):
+        self.tracker.update(result["ball"], ts)
+
+    async def publish(self, job):
+        ball = job.result["ball"]
+        rel_x, rel_y = self._relative(ball)
+        ball_detected = ball is not None
+
+        self.observe(job.result, job.ts)
+        vx, vy = self.tracker.velocity
+
+        # ---------------------------------------------------------
+        # POSÍLÁNÍ DAT
+        # ---------------------------------------------------------
+        now = time.time() * 1000
+        if now - self.last_send > SEND_INTERVAL_MS:
+
+            # všechny míče v jednom paketu / jedné zprávě – cena za snímek je konstantní
+            await self.send_result(job, self.targets(job.result))
+            records = self._records(job.result["balls"])
+
+            if getattr(self.manager, "bus", None) is not None:
+                await self.manager.bus.send_detect_ball(
+                    rel_x, rel_y, ball_detected, vx, vy, balls=records
+                )
+
+            self.last_send = now
+
+    def annotate(self, frame, result):
+        debug = frame.copy()
+
+        # okno sledování
+        if result.get("roi") is not None:
+            x0, y0, x1, y1 = result["roi"]
+            cv2.rectangle(debug, (x0, y0), (x1, y1), (255, 200, 0), 1)
+
+        # ---------------------------------------------------------
+        #  VÝSTUP
+        # ---------------------------------------------------------
+        ball = result["ball"]
+        if ball is not None:
+            bx = ball["x"]
+            by = ball["y"]
+            rel_x, rel_y = self._relative(ball)
+
+            cx2, cy2, r = ball["circle"]
+            cv2.circle(debug, (int(cx2), int(cy2)), int(r), (0, 255, 0), 2)
+            cv2.circle(debug, (bx, by), 6, (0, 255, 0), -1)
+
+            cv2.putText(
+                debug, f"X={rel_x} Y={rel_y}",
+                (bx + 10, by),
+                cv2.FONT_HERSHEY_SIMPLEX,
+                0.7,
+                (0, 255, 0), 2
+            )
+
+        # ---------------------------------------------------------
+        #  PREVIEW — BEZ JEDINÉ ZMĚNY (NEŠAHÁM NA TO!)
+        # ---------------------------------------------------------
+        if result["mask"] is None:
+            return debug
+
+        mask_color = cv2.cvtColor(result["mask"], cv2.COLOR_GRAY2BGR)
+        return np.hstack((debug, mask_color))
@@ -1,119 +1,250 @@
 import cv2
 import numpy as np
-import asyncio
 import time
+from collections import OrderedDict
 
+import detector_registry
 from base_mode import BaseCameraMode
+from capture_profile import CaptureProfile
+from frame_context import FrameContext
+from result_protocol import KIND_QR, MODE_IDS, Target
 
 
 SEND_ZMQ_INTERVAL = 0.5   # s – jak často posíláme ZMQ event na DisplayManager
 SEND_INTERVAL_MS = 10     # ms – jak často posíláme UDP data na RoboRIO
 
+# OpenCV detektor QR kódů – jeden na proces, drží ho registr
+detector_registry.register("qrcode", cv2.QRCodeDetector)
+
+
+def _get_detector():
+    return detector_registry.get("qrcode")
+
+
+# --------------------------------------------------------------
+#  DETECT KAŽDÝ SNÍMEK, DECODE JEN KDYŽ JE TO POTŘEBA
+#   lokalizace (detect/detectMulti) je levná, decode drahý – text se
+#   bere z cache, dokud se čtyřúhelník nepohne o víc než MOVE_PX
+#   a dokud nevyprší DECODE_TTL
+# --------------------------------------------------------------
+QR_MULTI = True           # detectMulti/decodeMulti – víc kódů v jednom snímku
+QR_LEVEL = 0              # lokalizace na zmenšenině 2^level, decode vždy v plném rozlišení
+MOVE_PX = 6.0             # posun rohů, po kterém se znovu dekóduje
+DECODE_TTL = 1.0          # s
+CACHE_SIZE = 16
+
+
+class DecodeCache:
+    """LRU cache text QR kódu podle geometrie čtyřúhelníku."""
+
+    def __init__(self, size=CACHE_SIZE, move_px=MOVE_PX, ttl=DECODE_TTL):
+        self.size = size
+        self.move_px = move_px
+        self.ttl = ttl
+        self.entries = OrderedDict()    # klíč geometrie → (rohy, text, čas dekódování)
+
+    def _key(self, quad):
+        return tuple(np.round(quad.reshape(-1) / self.move_px).astype(int))
+
+    def lookup(self, quad, now):
+        key = self._key(quad)
+        hit = self.entries.get(key)
+
+        # na hraně mřížky klíč nesedí – zkusíme nejbližší uložený čtyřúhelník
+        if hit is None:
+            for k, entry in self.entries.items():
+                if np.abs(entry[0] - quad).max() <= self.move_px:
+                    key, hit = k, entry
+                    break
+
+        if hit is None or np.abs(hit[0] - quad).max() > self.move_px or now - hit[2] > self.ttl:
+            return None
+
+        self.entries.move_to_end(key)
+        return hit[1]
+
+    def store(self, quad, text, now):
+        self.entries[self._key(quad)] = (quad, text, now)
+        self.entries.move_to_end(self._key(quad))
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+
+# jedna na proces – stejně jako detektor
+_cache = DecodeCache()
+
+
+def _locate(detector, img, multi):
+    """Čtyřúhelníky kódů jako pole (N, 4, 2) float32."""
+    if multi:
+        ok, points = detector.detectMulti(img)
+    else:
+        ok, points = detector.detect(img)
+    if not ok or points is None:
+        return np.zeros((0, 4, 2), np.float32)
+    return np.asarray(points, np.float32).reshape(-1, 4, 2)
+
+
+def _decode(detector, gray, quads, multi):
+    if multi:
+        ok, texts, _ = detector.decodeMulti(gray, quads)
+        return list(texts) if ok else [""] * len(quads)
+
+    texts = []
+    for q in quads:
+        text, _ = detector.decode(gray, q.reshape(1, 4, 2))
+        texts.append(text or "")
+    return texts
+
+
+def detect(frame, multi=QR_MULTI, level=QR_LEVEL):
+    """Detekce QR kódů – vrací data a 4 rohy každého dekódovaného kódu."""
+    # QR detektor si stejně dělá grayscale – dáme mu ten sdílený
+    ctx = FrameContext.wrap(frame)
+    gray = ctx.gray
+    detector = _get_detector()
+    now = time.monotonic()
+
+    try:
+        quads = _locate(detector, ctx.gray_pyr(level), multi) * (1 << level)
+
+        texts = [_cache.lookup(q, now) for q in quads]
+        todo = [i for i, t in enumerate(texts) if t is None]
+        if todo:
+            decoded = _decode(detector, gray, quads[todo], multi)
+            for i, text in zip(todo, decoded):
+                texts[i] = text
+                if text:
+                    _cache.store(quads[i], text, now)
+    except Exception as e:
+        return {"codes": [], "error": str(e)}
+
+    codes = [
+        {
+            "data": str(text),
+            "corners": np.int32(q).reshape(-1, 2).tolist(),  # (4, 2)
+        }
+        for q, text in zip(quads, texts)
+        if text
+    ]
+
+    return {"codes": codes, "decoded": len(todo), "cached": len(quads) - len(todo)}
+
+
+CAPTURE_PROFILE = CaptureProfile(width=640, height=480, fps=30, buffersize=1)
+
 
 class QRCodeMode(BaseCameraMode):
     name = "QRCODE"
+    mode_id = MODE_IDS["QRCODE"]
+    detect_fn = staticmethod(detect)
+    capture_profile = CAPTURE_PROFILE
+
+    @staticmethod
+    def prewarm_specs(manager):
+        return [("qrcode", {})]
+
+    def detect_params(self):
+        return {"multi": QR_MULTI, "level": QR_LEVEL}
+
+    def targets(self, result):
+        cx = self.frame_w // 2
+        cy = self.frame_h // 2
+        targets = []
+
+        for i, code in enumerate(result["codes"]):
+            pts = np.float32(code["corners"])  # (4, 2)
+            tx, ty = pts.mean(axis=0)
+            area = float(cv2.contourArea(pts))
+
+            targets.append(Target(
+                KIND_QR, i, float(tx - cx), float(ty - cy),
+                size=area ** 0.5, area=area, score=1.0,
+            ))
+        return targets
 
     async def start(self):
-        # OpenCV detektor QR kódů
-        self.detector = cv2.QRCodeDetector()
+        self.last_udp_send = 0.0
+        self.last_zmq_send = 0.0
         await super().start()
 
-    async def loop(self):
-        self.log.info("QRCode detection running")
-
+    async def publish(self, job):
         cx = self.frame_w // 2
         cy = self.frame_h // 2
 
-        last_udp_send = 0.0
-        last_zmq_send = 0.0
-
-        while self.running:
-            ok, frame = self.cap.read()
-            if not ok:
-                await asyncio.sleep(0)
-                continue
-
-            debug = frame.copy()
-
-            # ---------------------------------------------------------
-            #  DETEKCE JEDNOHO QR KÓDU
-            # ---------------------------------------------------------
-            codes = []
-            offset_x = -1.0
-            offset_y = -1.0
-
-            try:
-                # data = string, points = 4 body, straight_qrcode = nepoužijeme
-                data, points, _ = self.detector.detectAndDecode(debug)
-            except Exception as e:
-                self.log.warn(f"QRCode detectAndDecode error: {e}")
-                data = ""
-                points = None
-
-            if data and points is not None:
-                pts = np.int32(points)  # (4, 2)
-
-                tx = float(np.mean(pts[:, 0]))
-                ty = float(np.mean(pts[:, 1]))
-                dx = tx - cx
-                dy = ty - cy
-
-                offset_x = dx
-                offset_y = dy
-
-                # vykreslení obrysu a středu
-                cv2.polylines(debug, [pts], True, (0, 255, 0), 2)
-                cv2.circle(debug, (int(tx), int(ty)), 5, (0, 255, 0), -1)
-
-                label = str(data)
-                if len(label) > 20:
-                    label = label[:17] + "..."
-
-                cv2.putText(
-                    debug,
-                    label,
-                    (int(tx) + 10, int(ty) - 10),
-                    cv2.FONT_HERSHEY_SIMPLEX,
-                    0.5,
-                    (0, 255, 0),
-                    1,
-                )
-
-                codes.append(
-                    {
-                        "data": str(data),
-                        "center": [tx, ty],
-                        "offset": [dx, dy],
-                        "corners": pts.tolist(),
-                    }
-                )
-
-            # ---------------------------------------------------------
-            #  UDP → RoboRIO (X, Y jako u DETECTBALL)
-            # ---------------------------------------------------------
-            now_ms = time.time() * 1000.0
-            if now_ms - last_udp_send >= SEND_INTERVAL_MS:
-                await self.send_data(float(offset_x), float(offset_y))
-                last_udp_send = now_ms
-
-            # ---------------------------------------------------------
-            #  ZMQ → DISPLAY (JSON event s kompletními daty o kódu)
-            # ---------------------------------------------------------
-            now = time.time()
-            if now - last_zmq_send >= SEND_ZMQ_INTERVAL:
-                if getattr(self.manager, "bus", None) is not None:
-                    # očekává se CameraBus.send_qrcode(codes)
-                    try:
-                        await self.manager.bus.send_qrcode(codes)
-                    except AttributeError:
-                        # kdybys neměl send_qrcode, jen to ignoruj
-                        self.log.warn("CameraBus has no send_qrcode(), skipping")
-                last_zmq_send = now
-
-            # ---------------------------------------------------------
-            #  PREVIEW → WebPreview (ÚPLNĚ STEJNĚ JAKO APRILTAG)
-            # ---------------------------------------------------------
-            preview = cv2.resize(debug, (self.frame_w, self.frame_h))
-            await self.send_preview(preview)
-
-            await asyncio.sleep(0)
+        result = job.result
+        if "error" in result:
+            self.log.warn(f"QRCode detect/decode error: {result['error']}")
+
+        codes = []
+
+        for code in result["codes"]:
+            pts = np.int32(code["corners"])  # (4, 2)
+
+            tx = float(np.mean(pts[:, 0]))
+            ty = float(np.mean(pts[:, 1]))
+            dx = tx - cx
+            dy = ty - cy
+
+            codes.append(
+                {
+                    "data": code["data"],
+                    "center": [tx, ty],
+                    "offset": [dx, dy],
+                    "corners": code["corners"],
+                }
+            )
+
+        # ---------------------------------------------------------
+        #  UDP → RoboRIO (všechny kódy, offset X, Y jako u DETECTBALL)
+        # ---------------------------------------------------------
+        now_ms = time.time() * 1000.0
+        if now_ms - self.last_udp_send >= SEND_INTERVAL_MS:
+            await self.send_result(job, self.targets(result))
+            self.last_udp_send = now_ms
+
+        # ---------------------------------------------------------
+        #  ZMQ → DISPLAY (JSON event s kompletními daty o kódu)
+        # ---------------------------------------------------------
+        now = time.time()
+        if now - self.last_zmq_send >= SEND_ZMQ_INTERVAL:
+            if getattr(self.manager, "bus", None) is not None:
+                # očekává se CameraBus.send_qrcode(codes)
+                try:
+                    await self.manager.bus.send_qrcode(codes)
+                except AttributeError:
+                    # kdybys neměl send_qrcode, jen to ignoruj
+                    self.log.warn("CameraBus has no send_qrcode(), skipping")
+            self.last_zmq_send = now
+
+    def annotate(self, frame, result):
+        debug = frame.copy()
+
+        for code in result["codes"]:
+            pts = np.int32(code["corners"])  # (4, 2)
+
+            tx = float(np.mean(pts[:, 0]))
+            ty = float(np.mean(pts[:, 1]))
+
+            # vykreslení obrysu a středu
+            cv2.polylines(debug, [pts], True, (0, 255, 0), 2)
+            cv2.circle(debug, (int(tx), int(ty)), 5, (0, 255, 0), -1)
+
+            label = code["data"]
+            if len(label) > 20:
+                label = label[:17] + "..."
+
+            cv2.putText(
+                debug,
+                label,
+                (int(tx) + 10, int(ty) - 10),
+                cv2.FONT_HERSHEY_SIMPLEX,
+                0.5,
+                (0, 255, 0),
+                1,
+            )
+
+        # ---------------------------------------------------------
+        #  PREVIEW → WebPreview (ÚPLNĚ STEJNĚ JAKO APRILTAG)
+        # ---------------------------------------------------------
+        return debug
@@ -0,0 +1,124 @@
+import json
+import os
+
+import cv2
+import numpy as np
+
+try:
+    from pupil_apriltags import Detector as PupilDetector
+except ImportError:
+    PupilDetector = None
+
+
+# výsledek bench_apriltag.py --write – který backend je na tomhle HW nejrychlejší
+BACKEND_CHOICE_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "apriltag_backend.json"
+)
+
+
+# ============================================================
+#  BACKENDY – detect(gray) → [(id, family, center(2), corners(4x2))]
+#   rohy vždy v pořadí pupil_apriltags: dole vlevo, proti směru hodin
+# ============================================================
+class PupilBackend:
+    name = "pupil"
+
+    @staticmethod
+    def available():
+        return PupilDetector is not None
+
+    def __init__(self, quad_decimate, nthreads):
+        self.detector = PupilDetector(
+            families='tag36h11',
+            nthreads=nthreads,
+            quad_decimate=quad_decimate,
+            quad_sigma=0.0,
+            refine_edges=True
+        )
+
+    def detect(self, gray):
+        out = []
+        for t in self.detector.detect(gray, estimate_tag_pose=False):
+            family = t.tag_family.decode("utf-8") if isinstance(t.tag_family, bytes) else t.tag_family
+            out.append((int(t.tag_id), family, t.center, t.corners))
+        return out
+
+
+class ArucoBackend:
+    """OpenCV cv2.aruco se slovníkem DICT_APRILTAG_36h11 – bez další závislosti."""
+
+    name = "aruco"
+
+    @staticmethod
+    def available():
+        return hasattr(cv2, "aruco")
+
+    def __init__(self, quad_decimate, nthreads):
+        # nthreads: OpenCV má jen globální cv2.setNumThreads, ten tu neměníme
+        dictionary = cv2.aruco.getPredefinedDictionary(cv2.aruco.DICT_APRILTAG_36h11)
+
+        if hasattr(cv2.aruco, "DetectorParameters_create"):
+            params = cv2.aruco.DetectorParameters_create()      # OpenCV < 4.7
+        else:
+            params = cv2.aruco.DetectorParameters()
+        params.cornerRefinementMethod = cv2.aruco.CORNER_REFINE_APRILTAG
+        params.aprilTagQuadDecimate = float(quad_decimate)
+
+        if hasattr(cv2.aruco, "ArucoDetector"):
+            detector = cv2.aruco.ArucoDetector(dictionary, params)
+            self._detect = detector.detectMarkers
+        else:
+            self._detect = lambda img: cv2.aruco.detectMarkers(img, dictionary, parameters=params)
+
+    def detect(self, gray):
+        corners, ids, _ = self._detect(gray)
+        if ids is None:
+            return []
+
+        out = []
+        for c, tag_id in zip(corners, ids.reshape(-1)):
+            # aruco: nahoře vlevo po směru hodin → obrátit na pořadí pupil
+            c = c.reshape(4, 2)[::-1].astype(np.float64)
+            out.append((int(tag_id), "tag36h11", c.mean(axis=0), c))
+        return out
+
+
+BACKENDS = {
+    PupilBackend.name: PupilBackend,
+    ArucoBackend.name: ArucoBackend,
+}
+
+
+def available_backends():
+    return [name for name, cls in BACKENDS.items() if cls.available()]
+
+
+def resolve_backend(name="auto", log=None):
+    """
+    "auto" → backend vybraný benchmarkem (apriltag_backend.json), jinak první dostupný.
+    Nedostupný backend se nahradí dostupným s varováním.
+    """
+    available = available_backends()
+    if not available:
+        raise RuntimeError("Žádný AprilTag backend (pupil_apriltags ani cv2.aruco)")
+
+    if name == "auto":
+        name = available[0]
+        if os.path.exists(BACKEND_CHOICE_PATH):
+            try:
+                with open(BACKEND_CHOICE_PATH) as f:
+                    name = json.load(f)["backend"]
+            except Exception as e:
+                if log is not None:
+                    log.warn(f"{BACKEND_CHOICE_PATH} nečitelný: {e}")
+
+    if name not in available:
+        if log is not None:
+            log.warn(f"AprilTag backend {name} není dostupný, používám {available[0]}")
+        name = available[0]
+    return name
+
+
+def save_choice(name, results):
+    with open(BACKEND_CHOICE_PATH, "w") as f:
+        json.dump({"backend": name, "results": results}, f, indent=2)
@@ -1,11 +1,28 @@
 import asyncio
-import struct
+import time
 import cv2
 import socket
 
+from frame_context import FrameContext
+from motion_gate import MotionGate
+from pipeline import DropOldestQueue, FrameJob, Stage
+from stage_timer import StageTimer
+from preview_shm import MAX_HEIGHT, MAX_WIDTH
+import preview_protocol
+import result_protocol
+
+
+# statický snímek → znovu použít poslední výsledek místo detekce
+# (vypnuto, dokud nejsou prahy v motion_gate.py vyladěné na hřišti)
+MOTION_GATE = False
+
+# jednořádkový souhrn časů stage do logu, 0 = vypnuto
+STATS_LOG_INTERVAL = 10.0   # s
+
 
 class BaseCameraMode:
     name = "BASE"
+    mode_id = 0             # result_protocol.MODE_IDS – name může být složené (DETECTBALL+APRILTAG)
 
     def __init__(self, manager):
         from LoggerManager.logger import Logger  # lazy import kvůli cestám
@@ -13,11 +30,27 @@ class BaseCameraMode:
         self.manager = manager
         self.log = Logger(self.name)
         self.running = False
-        self.cap = None
+        self.source = None
         self.frame_w = 0
         self.frame_h = 0
+        self.last_seq = 0
+        self.captured = 0
+        self._last_preview = 0.0
+        self.stages = []
         self.task = None
 
+        self.gate = MotionGate() if MOTION_GATE else None
+        self._last_result = None
+
+        # časovače mimo stage: stáří snímku při převzetí, převody barev
+        # uvnitř detekce a celková latence expozice → odeslání
+        self.timers = {
+            "capture_age": StageTimer(),
+            "convert": StageTimer(),
+            "detect": StageTimer(),     # jen VisionPool – jinak je to stage "detect"
+            "e2e": StageTimer(),
+        }
+
     async def start(self):
         self.running = True
         ok = await self._init_camera()
@@ -37,33 +70,48 @@ class BaseCameraMode:
                 pass
             self.task = None
 
-        if self.cap:
-            try:
-                self.cap.release()
-            except:
-                pass
-            self.cap = None
+        if self.source:
+            self.manager.camera.detach(self)
+            self.source = None
 
         self.log.info("Zastaveno.")
 
     async def _init_camera(self):
-        for attempt in range(10):
-            cap = cv2.VideoCapture(0)
-            if cap.isOpened():
-                self.cap = cap
-                self.frame_w = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-                self.frame_h = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-                self.log.info(f"Kamera připravena: {self.frame_w}x{self.frame_h}")
-                return True
-
-            self.log.warn(f"Kamera nedostupná (pokus {attempt + 1}/10)")
-            await asyncio.sleep(0.5)
+        self.source = await self.manager.camera.attach(self)
+        if self.source is None:
+            return False
 
-        return False
+        self.frame_w = self.source.frame_w
+        self.frame_h = self.source.frame_h
+        # rovnou navážeme na poslední snímek, ať se nečeká na další
+        self.last_seq = self.source.latest()[2] - 1
+        return True
+
+    async def next_frame(self, timeout=1.0):
+        """Počká na nový snímek z FrameSource, neblokuje event loop."""
+        frame, ts, seq = await self.source.next_frame(self.last_seq, timeout)
+        if frame is not None:
+            self.last_seq = seq
+        return frame, ts, seq
+
+    async def send_result(self, job, targets):
+        """Výsledek snímku jedním paketem result_protocol – stejný formát pro všechny módy."""
+        latency_ms = (time.monotonic() - job.ts) * 1000.0
+        self.timers["e2e"].record(latency_ms)
 
-    async def send_data(self, *values):
+        # s platným offsetem hodin posíláme čas expozice rovnou v čase RoboRIO
+        ts, flags = job.ts, 0
+        clock = getattr(self.manager, "clock", None)
+        robot_ts = clock.to_robot(job.ts) if clock is not None else None
+        if robot_ts is not None:
+            ts, flags = robot_ts, result_protocol.FLAG_ROBOT_TIME
+
+        await self.send_packet(
+            result_protocol.encode(self.mode_id, job.seq, ts, latency_ms, targets, flags)
+        )
+
+    async def send_packet(self, packet):
         try:
-            packet = struct.pack("f" * len(values), *values)
             self.manager.udp_out.sendto(
                 packet,
                 (self.manager.ROBORIO_IP, self.manager.CAMERA_DATA_PORT),
@@ -72,20 +120,237 @@ class BaseCameraMode:
         except Exception as e:
             self.log.warn(f"Chyba při odesílání dat: {e}")
 
-    async def send_preview(self, frame):
-        import cv2
-
+    def send_preview(self, jpg, frame_id, ts):
+        # JPEG po kouscích pod MTU – velké snímky už neprasknou na limitu UDP
         try:
-            ok, jpg = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, 70])
-            if not ok:
-                self.log.warn("cv2.imencode selhal")
-                return
-
-            self.manager.preview_sock.sendto(
-                jpg.tobytes(), ("127.0.0.1", self.manager.PREVIEW_PORT)
-            )
+            addr = ("127.0.0.1", self.manager.PREVIEW_PORT)
+            for packet in preview_protocol.fragment(frame_id, ts, jpg):
+                self.manager.preview_sock.sendto(packet, addr)
         except Exception as e:
             self.log.warn(f"send_preview error: {e}")
 
-    async def loop(self):
+    # ---------------------------------------------------------
+    #  ROZHRANÍ MÓDU
+    #   detect_fn(frame, **params) – čistá detekce (vlákno / VisionPool)
+    #   publish(job)               – data pro RoboRIO a display (event loop)
+    #   targets(result)            – záznamy result_protocol pro RoboRIO
+    #   annotate(frame, result)    – obrázek pro preview (vlákno)
+    # ---------------------------------------------------------
+    detect_fn = None
+
+    def detect_params(self):
+        return {}
+
+    @staticmethod
+    def prewarm_specs(manager):
+        """Detektory [(typ, parametry)] pro detector_registry.prewarm při startu."""
+        return []
+
+    async def publish(self, job):
         raise NotImplementedError()
+
+    def observe(self, result, ts):
+        """Stav mezi snímky (trackery, regulátory) – volá publish módu i CompositeMode."""
+        pass
+
+    def targets(self, result):
+        return []
+
+    def has_target(self):
+        """True, dokud mód sleduje cíl – motion gate se pak obchází."""
+        return False
+
+    def annotate(self, frame, result):
+        return None
+
+    def preview_demand(self):
+        """Aktuální poptávka po preview (rozlišení, kvalita, fps) nebo None."""
+        demand = getattr(self.manager, "preview_demand", None)
+        return demand.active() if demand is not None else None
+
+    # ---------------------------------------------------------
+    #  PIPELINE  capture → detect → (transmit | annotate → preview)
+    #  Každá stage má vlastního workera, fronty zahazují nejstarší.
+    #  Data pro RoboRIO tak nikdy nečekají na JPEG.
+    # ---------------------------------------------------------
+    async def loop(self):
+        self.log.info(f"{self.name} running")
+
+        pool = getattr(self.manager, "pool", None)
+
+        q_detect = DropOldestQueue(1)
+        q_transmit = DropOldestQueue(2)
+        q_annotate = DropOldestQueue(1)
+        q_preview = DropOldestQueue(1)
+
+        detect_out = (q_transmit, q_annotate)
+        self._detect_out = detect_out
+
+        if pool is not None:
+            # stage jen předá snímek workerům, čas detekce hlásí _collect_pool
+            detect = Stage("submit", self._submit_pool, q_detect)
+        else:
+            detect = Stage("detect", self._stage_detect, q_detect, detect_out)
+
+        self.stages = [
+            detect,
+            Stage("transmit", self._stage_transmit, q_transmit),
+            Stage("annotate", self._stage_annotate, q_annotate, (q_preview,)),
+            Stage("preview", self._stage_preview, q_preview),
+        ]
+
+        tasks = [asyncio.create_task(self._stage_capture(q_detect))]
+        tasks += [asyncio.create_task(st.run(self.log)) for st in self.stages]
+        if STATS_LOG_INTERVAL > 0:
+            tasks.append(asyncio.create_task(self._log_stats(STATS_LOG_INTERVAL)))
+        if pool is not None:
+            tasks.append(asyncio.create_task(self._collect_pool(pool, detect_out)))
+
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for t in tasks:
+                t.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            if pool is not None:
+                await pool.drain()
+
+    async def _stage_capture(self, out):
+        while self.running:
+            frame, ts, seq = await self.next_frame()
+            if frame is None:
+                continue
+            self.captured += 1
+            self.timers["capture_age"].record((time.monotonic() - ts) * 1000.0)
+            out.put(FrameJob(seq, ts, frame))
+
+    def _reuse_result(self, job):
+        """Scéna se nehýbe → poslední výsledek s časem nového snímku."""
+        if self.gate is None or self._last_result is None:
+            return False
+        # sledovaný cíl se může hýbat pod prahem brány – detekovat vždy
+        if self.has_target():
+            return False
+        if not self.gate.static(job.frame):
+            return False
+        job.result = self._last_result
+        return True
+
+    def _stage_detect(self, job):
+        if not self._reuse_result(job):
+            ctx = FrameContext(job.frame)
+            job.result = self.detect_fn(ctx, **self.detect_params())
+            self.timers["convert"].record(ctx.convert_ms)
+            self._last_result = job.result
+        return job
+
+    async def _submit_pool(self, job):
+        pool = self.manager.pool
+
+        # starý výsledek jen když nic neletí – jinak by předběhl novější snímky
+        if not pool.has_pending() and self._reuse_result(job):
+            for q in self._detect_out:
+                q.put(job)
+            return
+
+        # plný kruh = snímek zahodíme, workeři jsou vytížení
+        if not pool.submit(self.detect_fn, job.frame, job.ts, job.seq, self.detect_params()):
+            if self.gate is not None:
+                self.gate.invalidate()
+
+    async def _collect_pool(self, pool, outqs):
+        while self.running:
+            res = await pool.next_result()
+            if res is None:
+                continue
+
+            self.timers["detect"].record(res.detect_ms)
+            self.timers["convert"].record(res.convert_ms)
+
+            job = FrameJob(res.seq, res.ts, res.frame)
+            job.result = res.result
+            self._last_result = res.result
+            for q in outqs:
+                q.put(job)
+
+    async def _stage_transmit(self, job):
+        await self.publish(job)
+
+    def _stage_annotate(self, job):
+        # nikdo se nedívá → žádná kopie, kreslení ani kódování
+        demand = self.preview_demand()
+        if demand is None:
+            return None
+
+        now = time.monotonic()
+        if now - self._last_preview < 1.0 / demand["fps"]:
+            return None
+
+        preview = self.annotate(job.frame, job.result)
+        if preview is None:
+            return None
+        self._last_preview = now
+
+        w = demand["width"] or self.frame_w
+        h = demand["height"] or self.frame_h
+        if preview.shape[1] != w or preview.shape[0] != h:
+            preview = cv2.resize(preview, (w, h))
+
+        job.preview = preview
+        job.quality = demand["quality"]
+        return job
+
+    def _stage_preview(self, job):
+        # sdílená paměť: raw snímek, kódují si ho až konzumenti
+        shm = getattr(self.manager, "preview_shm", None)
+        if shm is not None:
+            preview = job.preview
+            h, w = preview.shape[:2]
+            if w > MAX_WIDTH or h > MAX_HEIGHT:
+                scale = min(MAX_WIDTH / w, MAX_HEIGHT / h)
+                preview = cv2.resize(preview, (int(w * scale), int(h * scale)))
+            shm.write(preview, job.seq, job.ts)
+            return None
+
+        ok, jpg = cv2.imencode(
+            ".jpg", job.preview, [cv2.IMWRITE_JPEG_QUALITY, job.quality]
+        )
+        if not ok:
+            self.log.warn("cv2.imencode selhal")
+            return None
+
+        job.jpg = jpg.tobytes()
+        self.send_preview(job.jpg, job.seq, job.ts)
+
+    def timing_stats(self):
+        """Percentily a fps všech stage a časovačů – odpověď na get_stats."""
+        stats = {name: t.stats() for name, t in self.timers.items()}
+        for st in self.stages:
+            stats[st.name] = st.timer.stats()
+        return stats
+
+    async def _log_stats(self, interval):
+        while self.running:
+            await asyncio.sleep(interval)
+            stats = self.timing_stats()
+
+            parts = [f"capture {stats['capture_age']['fps']:.1f} fps"]
+            names = dict.fromkeys(("convert", "detect", *(st.name for st in self.stages), "e2e"))
+            for name in names:
+                s = stats.get(name)
+                if s and s["p50_ms"] is not None:
+                    parts.append(f"{name} {s['p50_ms']:.1f}/{s['p95_ms']:.1f}/{s['p99_ms']:.1f} ms")
+            self.log.info("p50/p95/p99: " + " | ".join(parts))
+
+    def pipeline_stats(self):
+        stats = {"capture": {"count": self.captured, **self.timers["capture_age"].stats()}}
+        for st in self.stages:
+            stats[st.name] = st.stats()
+
+        if self.gate is not None:
+            stats["gate"] = self.gate.stats()
+
+        pool = getattr(self.manager, "pool", None)
+        if pool is not None:
+            stats["pool"] = pool.stats()
+        return stats
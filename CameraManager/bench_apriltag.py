@@ -0,0 +1,89 @@
+"""
+Benchmark AprilTag backendů – latence na snímek a recall na uložených snímcích.
+Nejrychlejší backend, který splní --min-recall, se s --write uloží do
+apriltag_backend.json a AprilTag mód (APRILTAG_BACKEND = "auto") ho použije.
+
+    python3 bench_apriltag.py --frames ./frames
+    python3 bench_apriltag.py --frames ./frames --decimate 2.0 --min-recall 0.95 --write
+"""
+import argparse
+import time
+
+from apriltag_backends import BACKENDS, available_backends, save_choice
+from bench_pool import load_frames, percentile
+from frame_context import FrameContext
+
+
+def run_backend(name, grays, decimate, nthreads):
+    backend = BACKENDS[name](decimate, nthreads)
+    backend.detect(grays[0])    # zahřátí
+
+    times = []
+    found = []
+    for gray in grays:
+        t0 = time.perf_counter()
+        tags = backend.detect(gray)
+        times.append((time.perf_counter() - t0) * 1000.0)
+        found.append({t[0] for t in tags})
+    return times, found
+
+
+def bench(grays, decimate, nthreads, min_recall):
+    names = available_backends()
+    runs = {name: run_backend(name, grays, decimate, nthreads) for name in names}
+
+    # referenční sada = sjednocení všeho, co kterýkoli backend na snímku našel
+    reference = [set().union(*(runs[n][1][i] for n in names)) for i in range(len(grays))]
+    total = sum(len(ref) for ref in reference)
+
+    results = {}
+    for name in names:
+        times, found = runs[name]
+        hits = sum(len(f & ref) for f, ref in zip(found, reference))
+        results[name] = {
+            "p50_ms": round(percentile(times, 50), 2),
+            "p95_ms": round(percentile(times, 95), 2),
+            "recall": round(hits / total, 3) if total else None,
+        }
+        r = results[name]
+        recall = f"{r['recall'] * 100:5.1f} %" if r["recall"] is not None else "    -  "
+        print(f"{name:>8}: p50 {r['p50_ms']:6.2f} ms   p95 {r['p95_ms']:6.2f} ms   recall {recall}")
+
+    if total == 0:
+        # bez tagů by vyhrál backend, který nic nenajde – nevybírat
+        print("Na snímcích není žádný tag – recall nejde změřit, použij --frames.")
+        return None, results
+
+    ok = [n for n in names if results[n]["recall"] >= min_recall]
+    best = min(ok, key=lambda n: results[n]["p50_ms"]) if ok else None
+    return best, results
+
+
+def main():
+    ap = argparse.ArgumentParser(description="AprilTag backend benchmark")
+    ap.add_argument("--frames", default=None, help="adresář se snímky s tagy")
+    ap.add_argument("--count", type=int, default=200)
+    ap.add_argument("--decimate", type=float, default=2.0)
+    ap.add_argument("--threads", type=int, default=1)
+    ap.add_argument("--min-recall", type=float, default=0.95)
+    ap.add_argument("--write", action="store_true", help="uložit vítěze do apriltag_backend.json")
+    args = ap.parse_args()
+
+    frames = load_frames(args.frames, args.count)
+    grays = [FrameContext(f).gray for f in frames]
+    h, w = grays[0].shape[:2]
+    print(f"{len(grays)} snímků {w}x{h}, quad_decimate={args.decimate}, backendy: {available_backends()}")
+
+    best, results = bench(grays, args.decimate, args.threads, args.min_recall)
+    if best is None:
+        if any(r["recall"] is not None for r in results.values()):
+            print(f"Žádný backend nesplnil recall {args.min_recall}.")
+        return
+
+    print(f"Vybrán: {best}")
+    if args.write:
+        save_choice(best, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Benchmark VisionPool – propustnost a latence detekce pro 0 (inline) až N workerů.
+
+    python3 bench_pool.py --mode DETECTBALL --workers 1,2,3,4
+    python3 bench_pool.py --mode APRILTAG --frames ./frames --count 500
+"""
+import argparse
+import asyncio
+import glob
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from LoggerManager.logger import Logger
+
+from Modes import apriltag, detect_ball, detect_qrcode
+from vision_pool import VisionPool
+
+
+DETECTORS = {
+    "DETECTBALL": detect_ball.detect,
+    "APRILTAG": apriltag.detect,
+    "QRCODE": detect_qrcode.detect,
+}
+
+
+def load_frames(path, count):
+    frames = []
+    if path:
+        for f in sorted(glob.glob(os.path.join(path, "*"))):
+            img = cv2.imread(f, cv2.IMREAD_COLOR)
+            if img is not None:
+                frames.append(img)
+
+    if not frames:
+        # syntetické snímky: šum + červený míč na různých místech
+        rng = np.random.default_rng(0)
+        for i in range(16):
+            img = rng.integers(0, 80, (480, 640, 3), dtype=np.uint8)
+            cv2.circle(img, (80 + i * 30, 240), 40, (40, 20, 220), -1)
+            frames.append(img)
+
+    return [frames[i % len(frames)] for i in range(count)]
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def report(label, latencies, elapsed):
+    print(
+        f"{label:>10}: {len(latencies) / elapsed:7.1f} fps   "
+        f"p50 {percentile(latencies, 50):6.1f} ms   "
+        f"p95 {percentile(latencies, 95):6.1f} ms"
+    )
+
+
+def bench_inline(fn, frames):
+    latencies = []
+    t_start = time.monotonic()
+    for frame in frames:
+        t0 = time.monotonic()
+        fn(frame)
+        latencies.append((time.monotonic() - t0) * 1000.0)
+    report("inline", latencies, time.monotonic() - t_start)
+
+
+async def bench_pool(fn, frames, workers):
+    pool = VisionPool(workers, Logger("VisionPool"))
+    latencies = []
+
+    # zahřátí – spawn workerů a import detektorů se nepočítá
+    for i in range(workers):
+        pool.submit(fn, frames[0], time.monotonic(), i)
+    await pool.drain()
+
+    async def collect():
+        res = await pool.next_result()
+        if res is not None:
+            latencies.append((time.monotonic() - res.ts) * 1000.0)
+
+    t_start = time.monotonic()
+    for seq, frame in enumerate(frames):
+        while not pool.submit(fn, frame, time.monotonic(), seq):
+            await collect()
+    while pool.has_pending():
+        await collect()
+    elapsed = time.monotonic() - t_start
+
+    pool.close()
+    report(f"{workers} workers", latencies, elapsed)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="VisionPool benchmark")
+    ap.add_argument("--mode", default="DETECTBALL", choices=sorted(DETECTORS))
+    ap.add_argument("--frames", default=None, help="adresář se snímky (jinak syntetické)")
+    ap.add_argument("--count", type=int, default=300)
+    ap.add_argument("--workers", default="1,2,3,4")
+    args = ap.parse_args()
+
+    fn = DETECTORS[args.mode]
+    frames = load_frames(args.frames, args.count)
+    h, w = frames[0].shape[:2]
+    print(f"{args.mode}: {len(frames)} snímků {w}x{h}")
+
+    bench_inline(fn, frames)
+    for workers in (int(x) for x in args.workers.split(",")):
+        asyncio.run(bench_pool(fn, frames, workers))
+
+
+if __name__ == "__main__":
+    main()
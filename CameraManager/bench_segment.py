@@ -0,0 +1,66 @@
+"""
+Benchmark segmentace míče: cvtColor(BGR2HSV) + inRange proti BGR lookup tabulce.
+
+    python3 bench_segment.py
+    python3 bench_segment.py --frames ./frames --count 500
+"""
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from bench_pool import load_frames, percentile
+from color_lut import ColorLUT
+from Modes.detect_ball import HSV_LOWER, HSV_UPPER
+
+
+def hsv_inrange(frame):
+    hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+    return cv2.inRange(hsv, HSV_LOWER, HSV_UPPER)
+
+
+def bench(label, fn, frames, reference=None):
+    times = []
+    agree = []
+
+    for i, frame in enumerate(frames):
+        t0 = time.perf_counter()
+        mask = fn(frame)
+        times.append((time.perf_counter() - t0) * 1000.0)
+
+        if reference is not None:
+            agree.append(np.count_nonzero(mask == reference[i]) / mask.size)
+
+    line = (
+        f"{label:>14}: p50 {percentile(times, 50):6.2f} ms   "
+        f"p95 {percentile(times, 95):6.2f} ms"
+    )
+    if agree:
+        line += f"   shoda s HSV {np.mean(agree) * 100:6.2f} %"
+    print(line)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Ball segmentation benchmark")
+    ap.add_argument("--frames", default=None, help="adresář se snímky (jinak syntetické)")
+    ap.add_argument("--count", type=int, default=300)
+    args = ap.parse_args()
+
+    frames = load_frames(args.frames, args.count)
+    h, w = frames[0].shape[:2]
+    print(f"{len(frames)} snímků {w}x{h}")
+
+    reference = [hsv_inrange(f) for f in frames]
+    bench("cvtColor+inRange", hsv_inrange, frames)
+
+    for bits in (5, 6):
+        lut = ColorLUT(bits)
+        t0 = time.perf_counter()
+        lut.build(HSV_LOWER, HSV_UPPER)
+        print(f"{'LUT build ' + str(bits) + 'b':>14}: {(time.perf_counter() - t0) * 1000.0:6.2f} ms")
+        bench(f"LUT {bits}b", lambda f: lut.mask(f, HSV_LOWER, HSV_UPPER), frames, reference)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+import json
+import math
+import os
+
+import cv2
+import numpy as np
+
+
+# výchozí kalibrace vedle CameraManageru – width/height = rozlišení, pro které platí matice.
+# Není v gitu – každá kamera má svou; formát viz calibration.example.json
+CALIBRATION_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "calibration.json")
+
+# načítá se jednou na proces a rozlišení (hlavní proces i VisionPool worker)
+_cache = {}
+
+
+class Calibration:
+    """Vnitřní parametry kamery + velikost tagu a seznam ID, pro která počítáme pózu."""
+
+    def __init__(self, camera_matrix, dist_coeffs, tag_size, pose_ids):
+        self.camera_matrix = camera_matrix
+        self.dist_coeffs = dist_coeffs
+        self.tag_size = tag_size
+        self.pose_ids = frozenset(pose_ids)
+
+        # rohy tagu v pořadí, které chce SOLVEPNP_IPPE_SQUARE;
+        # odpovídá pořadí rohů z pupil_apriltags (dole vlevo, proti směru hodin)
+        s = tag_size / 2.0
+        self.object_points = np.array(
+            [[-s, s, 0.0], [s, s, 0.0], [s, -s, 0.0], [-s, -s, 0.0]], np.float32
+        )
+
+    def pose(self, corners):
+        """
+        Póza tagu vůči kameře (x vpravo, y dolů, z dopředu, metry) nebo None.
+        yaw = natočení tagu kolem svislé osy kamery ve stupních.
+        """
+        img = np.asarray(corners, np.float32).reshape(4, 1, 2)
+        ok, rvec, tvec = cv2.solvePnP(
+            self.object_points, img, self.camera_matrix, self.dist_coeffs,
+            flags=cv2.SOLVEPNP_IPPE_SQUARE,
+        )
+        if not ok:
+            return None
+
+        R, _ = cv2.Rodrigues(rvec)
+        t = tvec.reshape(3)
+        return {
+            "t": [float(v) for v in t],
+            "rvec": [float(v) for v in rvec.reshape(3)],
+            "distance": float(np.linalg.norm(t)),
+            "yaw": math.degrees(math.atan2(R[0, 2], R[2, 2])),
+        }
+
+
+def load_calibration(width, height, path=CALIBRATION_PATH, log=None):
+    """
+    Kalibrace přepočtená na dané rozlišení, z cache. None, když soubor chybí
+    nebo je vadný – póza se pak prostě nepočítá. Chyba se cachuje taky,
+    detect() ji jinak zkoušel na každém snímku.
+    """
+    key = (path, width, height)
+    if key in _cache:
+        return _cache[key]
+
+    calib = None
+    if os.path.exists(path):
+        try:
+            calib = _parse(path, width, height)
+        except Exception as e:
+            if log is not None:
+                log.warn(f"{path} nečitelný, póza se nepočítá: {e!r}")
+
+    _cache[key] = calib
+    return calib
+
+
+def _parse(path, width, height):
+    with open(path) as f:
+        data = json.load(f)
+
+    K = np.array(data["camera_matrix"], np.float64)
+    if K.shape != (3, 3):
+        raise ValueError(f"camera_matrix má tvar {K.shape}, čekám 3x3")
+    # matice je pro rozlišení z kalibrace – jiný capture profil ji jen přeškáluje
+    sx = width / data.get("width", width)
+    sy = height / data.get("height", height)
+    K[0, 0] *= sx
+    K[0, 2] *= sx
+    K[1, 1] *= sy
+    K[1, 2] *= sy
+
+    return Calibration(
+        K,
+        np.array(data.get("dist_coeffs", [0.0] * 5), np.float64),
+        float(data["tag_size"]),
+        data.get("pose_ids", []),
+    )
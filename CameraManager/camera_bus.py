@@ -40,7 +40,7 @@ class CameraBus:
         except Exception as e:
             self.log.warn(f"send_apriltag failed: {e}")
 
-    async def send_detect_ball(self, rel_x, rel_y, detected):
+    async def send_detect_ball(self, rel_x, rel_y, detected, vx=0.0, vy=0.0, balls=()):
         msg = {
             "sender": self.sender_name,
             "target": self.target_name,
@@ -52,7 +52,15 @@ class CameraBus:
                     "x": float(rel_x),
                     "y": float(rel_y),
                     "detected": bool(detected),
+                    "vx": float(vx),
+                    "vy": float(vy),
                 },
+                # všechny nalezené míče seřazené podle skóre, "ball" = první z nich
+                "balls": [
+                    {"x": float(x), "y": float(y), "r": float(r),
+                     "area": float(area), "score": float(score)}
+                    for x, y, r, area, score in balls
+                ],
             },
         }
 
@@ -80,6 +88,23 @@ class CameraBus:
         except Exception as e:
             self.log.warn(f"send_qrcode failed: {e}")
 
+    async def send_composite(self, results):
+        msg = {
+            "sender": self.sender_name,
+            "target": self.target_name,
+            "type": "camera_event",
+            "mode": "COMPOSITE",
+            "payload": {
+                "timestamp": time.time(),
+                "results": results,
+            },
+        }
+
+        try:
+            await self.sock.send(jsonapi.dumps(msg))
+        except Exception as e:
+            self.log.warn(f"send_composite failed: {e}")
+
     async def close(self):
         try:
             self.sock.close(linger=0)
@@ -0,0 +1,101 @@
+import asyncio
+
+from capture_profile import DEFAULT_PROFILE
+from frame_source import FrameSource
+
+
+OPEN_RETRIES = 10
+OPEN_RETRY_DELAY = 0.5  # s
+
+
+class CameraService:
+    """Dlouhožijící vlastník kamery – zařízení zůstává otevřené přes přepínání módů."""
+
+    def __init__(self, log, profile=DEFAULT_PROFILE):
+        self.log = log
+        self.profile = profile
+        self.negotiated = None
+        self.source = None
+        self.owner = None
+        self._open_lock = asyncio.Lock()
+
+    @property
+    def is_open(self):
+        return self.source is not None and self.source.running
+
+    async def open(self, profile=None):
+        profile = profile or self.profile
+
+        async with self._open_lock:
+            if self.is_open and profile == self.profile:
+                return True
+
+            # jiné zařízení = zavřít a otevřít znovu, jinak stačí přenastavit stream
+            if self.is_open and profile.device == self.profile.device:
+                if await self._reconfigure(profile):
+                    return True
+                # grab vlákno visí v read() – zařízení otevřeme znovu
+
+            if self.source:
+                await asyncio.get_running_loop().run_in_executor(None, self.source.release)
+                self.source = None
+
+            loop = asyncio.get_running_loop()
+            for attempt in range(OPEN_RETRIES):
+                cap = await loop.run_in_executor(None, profile.open)
+                if cap.isOpened():
+                    self.profile = profile
+                    self.negotiated = await loop.run_in_executor(None, profile.apply, cap, self.log)
+                    self.source = FrameSource(cap, self.log)
+                    self.source.start()
+                    self.log.info(
+                        f"Kamera připravena: {self.source.frame_w}x{self.source.frame_h}"
+                    )
+                    return True
+
+                cap.release()
+                self.log.warn(f"Kamera nedostupná (pokus {attempt + 1}/{OPEN_RETRIES})")
+                await asyncio.sleep(OPEN_RETRY_DELAY)
+
+            return False
+
+    async def _reconfigure(self, profile):
+        """False = grab vlákno nešlo zastavit, cap se nesmí přenastavovat."""
+        loop = asyncio.get_running_loop()
+        source = self.source
+
+        # grab vlákno musí stát, V4L2 nejde přenastavit během read()
+        if not await loop.run_in_executor(None, source.stop):
+            self.log.warn("Kamera se nedá přenastavit za běhu, otevírám ji znovu.")
+            return False
+        # set() + read-back V4L2 trvá stovky ms – mimo event loop
+        self.negotiated = await loop.run_in_executor(None, profile.apply, source.cap, self.log)
+        source.update_size()
+        source.start()
+
+        self.profile = profile
+        return True
+
+    async def attach(self, mode):
+        """Připojí mód ke streamu. Vrací FrameSource nebo None, když kamera nejde otevřít."""
+        profile = getattr(mode, "capture_profile", None) or self.profile
+        if not await self.open(profile):
+            return None
+
+        if self.owner is not None and self.owner is not mode:
+            self.log.warn(f"{self.owner.name} je stále připojen, přebírá {mode.name}")
+
+        self.owner = mode
+        return self.source
+
+    def detach(self, mode):
+        # kamera běží dál, jen mód přestane odebírat snímky
+        if self.owner is mode:
+            self.owner = None
+
+    async def close(self):
+        self.owner = None
+        if self.source:
+            await asyncio.get_running_loop().run_in_executor(None, self.source.release)
+            self.source = None
+            self.log.info("Kamera uvolněna.")
@@ -0,0 +1,97 @@
+import cv2
+
+
+# V4L2 backend: CAP_PROP_AUTO_EXPOSURE 1 = manuál, 3 = aperture priority (auto)
+V4L2_EXPOSURE_MANUAL = 1
+V4L2_EXPOSURE_AUTO = 3
+
+
+def _fourcc_str(value):
+    value = int(value)
+    return "".join(chr((value >> (8 * i)) & 0xFF) for i in range(4))
+
+
+class CaptureProfile:
+    """Nastavení kamery pro mód – zařízení, formát, rozlišení, fps, buffer a expozice."""
+
+    def __init__(self, device=0, fourcc="MJPG", width=640, height=480, fps=30,
+                 buffersize=1, auto_exposure=None, exposure=None):
+        self.device = device
+        self.fourcc = fourcc          # "MJPG" / "YUYV" / None = výchozí ovladače
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.buffersize = buffersize
+        self.auto_exposure = auto_exposure  # None = nesahat
+        self.exposure = exposure            # jen při auto_exposure=False
+
+    def key(self):
+        return (self.device, self.fourcc, self.width, self.height, self.fps,
+                self.buffersize, self.auto_exposure, self.exposure)
+
+    def __eq__(self, other):
+        return isinstance(other, CaptureProfile) and self.key() == other.key()
+
+    def __hash__(self):
+        return hash(self.key())
+
+    def __repr__(self):
+        return f"{self.fourcc or '-'} {self.width}x{self.height}@{self.fps} buf={self.buffersize}"
+
+    # ---------------------------------------------------------
+    def open(self):
+        return cv2.VideoCapture(self.device, cv2.CAP_V4L2)
+
+    def apply(self, cap, log):
+        """Nastaví profil na otevřenou kameru a vrátí, co ovladač skutečně vyjednal."""
+        # FOURCC musí jít před rozlišením, jinak V4L2 vyjedná rozlišení pro starý formát
+        if self.fourcc:
+            cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*self.fourcc))
+
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.width)
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
+        cap.set(cv2.CAP_PROP_FPS, self.fps)
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, self.buffersize)
+
+        if self.auto_exposure is not None:
+            cap.set(
+                cv2.CAP_PROP_AUTO_EXPOSURE,
+                V4L2_EXPOSURE_AUTO if self.auto_exposure else V4L2_EXPOSURE_MANUAL,
+            )
+            if not self.auto_exposure and self.exposure is not None:
+                cap.set(cv2.CAP_PROP_EXPOSURE, self.exposure)
+
+        negotiated = {
+            "fourcc": _fourcc_str(cap.get(cv2.CAP_PROP_FOURCC)),
+            "width": int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            "height": int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+            "fps": float(cap.get(cv2.CAP_PROP_FPS)),
+            "buffersize": int(cap.get(cv2.CAP_PROP_BUFFERSIZE)),
+        }
+
+        # ověření – ovladač smí hodnoty tiše změnit
+        wanted = {
+            "fourcc": self.fourcc,
+            "width": self.width,
+            "height": self.height,
+            "fps": float(self.fps),
+            "buffersize": self.buffersize,
+        }
+        for name, value in wanted.items():
+            if value is None:
+                continue
+            got = negotiated[name]
+            if name == "fps" and abs(got - value) < 0.5:
+                continue
+            if got != value:
+                log.warn(f"Kamera: {name} chci {value}, ovladač dal {got}")
+
+        log.info(
+            f"Kamera profil: {negotiated['fourcc']} {negotiated['width']}x{negotiated['height']}"
+            f"@{negotiated['fps']:.0f} buf={negotiated['buffersize']}"
+        )
+        return negotiated
+
+
+# výchozí profil, když mód žádný nemá – odpovídá původnímu chování
+DEFAULT_PROFILE = CaptureProfile()
@@ -0,0 +1,47 @@
+"""
+Náhrada RoboRIO pro test synchronizace hodin – odpovídá na pingy z ClockSync.
+--skew posune "čas robota", aby šlo ověřit, že CameraManager offset najde.
+
+    python3 clock_responder.py --skew 1234.5
+    (v CameraManageru ROBORIO_IP → 127.0.0.1)
+"""
+import argparse
+import socket
+import time
+
+from clock_sync import PING, PONG, pack, unpack
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Clock sync responder (RoboRIO stand-in)")
+    ap.add_argument("--port", type=int, default=None, help="výchozí CLOCK_SYNC_PORT z ports.py")
+    ap.add_argument("--skew", type=float, default=0.0, help="posun hodin robota v s")
+    args = ap.parse_args()
+
+    port = args.port
+    if port is None:
+        import os
+        import sys
+        sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+        from ProgramManager.ports import CLOCK_SYNC_PORT
+        port = CLOCK_SYNC_PORT
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(("0.0.0.0", port))
+    print(f"Clock responder on UDP {port}, skew {args.skew:+.3f} s")
+
+    while True:
+        data, addr = sock.recvfrom(64)
+        t1 = time.monotonic() + args.skew
+
+        msg = unpack(data)
+        if msg is None or msg[0] != PING:
+            continue
+        _, seq, t0, _, _ = msg
+
+        t2 = time.monotonic() + args.skew
+        sock.sendto(pack(PONG, seq, t0, t1, t2), addr)
+
+
+if __name__ == "__main__":
+    main()
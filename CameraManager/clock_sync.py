@@ -0,0 +1,151 @@
+import asyncio
+import collections
+import socket
+import struct
+import time
+
+
+# --------------------------------------------------------------
+#  SYNCHRONIZACE HODIN Pi ↔ RoboRIO (NTP styl)
+#   Pi:  ping  seq, t0                      (t0 = Pi monotonic při odeslání)
+#   Rio: pong  seq, t0, t1, t2              (t1 příjem, t2 odeslání v čase RoboRIO)
+#   Pi:  t3 při příjmu
+#   offset = ((t1 - t0) + (t2 - t3)) / 2    čas RoboRIO = čas Pi + offset
+#   rtt    = (t3 - t0) - (t2 - t1)
+# --------------------------------------------------------------
+MAGIC = b"CLK1"
+PACKET = struct.Struct("<4sBIddd")
+PING = 0
+PONG = 1
+
+SYNC_INTERVAL = 0.5     # s mezi pingy
+WINDOW = 8              # vzorků, z nich se bere ten s nejkratším rtt
+MAX_RTT = 0.05          # s – delší výměny jsou zatížené frontami, zahodit
+STALE_AFTER = 5.0       # s bez platného vzorku → offset neplatí
+SMOOTHING = 0.3         # EWMA nad vybraným vzorkem
+
+
+def pack(kind, seq, t0, t1=0.0, t2=0.0):
+    return PACKET.pack(MAGIC, kind, seq & 0xFFFFFFFF, t0, t1, t2)
+
+
+def unpack(data):
+    """(kind, seq, t0, t1, t2) nebo None pro cizí paket."""
+    if len(data) != PACKET.size:
+        return None
+    magic, kind, seq, t0, t1, t2 = PACKET.unpack(data)
+    if magic != MAGIC:
+        return None
+    return kind, seq, t0, t1, t2
+
+
+class ClockSync:
+    """Průběžný odhad offsetu hodin RoboRIO vůči time.monotonic() na Pi."""
+
+    def __init__(self, log, addr, interval=SYNC_INTERVAL):
+        self.log = log
+        self.addr = addr
+        self.interval = interval
+
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(("0.0.0.0", 0))
+        # recvfrom běží v executoru – s timeoutem vlákno nepřežije zavření socketu
+        self.sock.settimeout(1.0)
+
+        self.samples = collections.deque(maxlen=WINDOW)    # (rtt, offset)
+        self.offset = None
+        self.rtt = None
+        self.last_sample = 0.0
+        self.seq = 0
+        self.sent = 0
+        self.received = 0
+        self.rejected = 0
+
+    @property
+    def valid(self):
+        return self.offset is not None and time.monotonic() - self.last_sample < STALE_AFTER
+
+    def to_robot(self, ts):
+        """Pi monotonic → čas RoboRIO, None dokud offset neplatí."""
+        if not self.valid:
+            return None
+        return ts + self.offset
+
+    async def run(self):
+        self.log.info(f"Clock sync → {self.addr[0]}:{self.addr[1]}")
+        tasks = [asyncio.create_task(self._send_loop()), asyncio.create_task(self._recv_loop())]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for t in tasks:
+                t.cancel()
+
+    async def _send_loop(self):
+        while True:
+            self.seq += 1
+            try:
+                self.sock.sendto(pack(PING, self.seq, time.monotonic()), self.addr)
+                self.sent += 1
+            except Exception as e:
+                self.log.warn(f"Clock sync ping selhal: {e}")
+            await asyncio.sleep(self.interval)
+
+    def _recv(self):
+        data, _ = self.sock.recvfrom(64)
+        # t3 hned po příjmu ve vlákně – ne až po naplánování v event loopu
+        return data, time.monotonic()
+
+    async def _recv_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                data, t3 = await loop.run_in_executor(None, self._recv)
+            except socket.timeout:
+                continue
+            except OSError:
+                # socket zavřený při vypnutí; jinak ICMP "port unreachable",
+                # dokud na RoboRIO neběží odpovídač
+                if self.sock.fileno() == -1:
+                    return
+                await asyncio.sleep(self.interval)
+                continue
+
+            msg = unpack(data)
+            if msg is None or msg[0] != PONG:
+                continue
+            _, _, t0, t1, t2 = msg
+            self.received += 1
+            self._add_sample(t0, t1, t2, t3)
+
+    def _add_sample(self, t0, t1, t2, t3):
+        rtt = (t3 - t0) - (t2 - t1)
+        if rtt < 0 or rtt > MAX_RTT:
+            self.rejected += 1
+            return
+
+        self.samples.append((rtt, ((t1 - t0) + (t2 - t3)) / 2.0))
+        best_rtt, best_offset = min(self.samples)
+
+        first = self.offset is None
+        self.offset = best_offset if first else self.offset + SMOOTHING * (best_offset - self.offset)
+        self.rtt = best_rtt
+        self.last_sample = time.monotonic()
+
+        if first:
+            self.log.info(f"Clock sync: offset {self.offset:+.6f} s, rtt {rtt * 1000.0:.2f} ms")
+
+    def stats(self):
+        return {
+            "valid": self.valid,
+            "offset_s": self.offset,
+            "rtt_ms": round(self.rtt * 1000.0, 3) if self.rtt is not None else None,
+            "sent": self.sent,
+            "received": self.received,
+            "rejected": self.rejected,
+        }
+
+    def close(self):
+        try:
+            self.sock.close()
+        except Exception:
+            pass
@@ -0,0 +1,44 @@
+import cv2
+import numpy as np
+
+
+class ColorLUT:
+    """
+    Segmentace barvy jedním vyhledáním v tabulce: BGR kvantované na `bits` bitů/kanál
+    → 0/255. Tabulka se staví z HSV mezí jednou a při změně mezí se sama přestaví.
+    """
+
+    def __init__(self, bits=5):
+        self.bits = bits
+        self.shift = 8 - bits
+        # 5 bitů = 32x32x32 = 15bit index, 6 bitů = 64x64x64 = 18bit index
+        self.index_dtype = np.uint16 if 3 * bits <= 16 else np.uint32
+
+        self.key = None
+        self.table = None
+
+    def build(self, lower, upper):
+        n = 1 << self.bits
+        step = 256 // n
+
+        # každou buňku krychle reprezentuje její střed
+        centers = (np.arange(n) * step + step // 2).astype(np.uint8)
+        b, g, r = np.meshgrid(centers, centers, centers, indexing="ij")
+        cube = np.stack([b, g, r], axis=-1).reshape(-1, 1, 3)
+
+        hsv = cv2.cvtColor(cube, cv2.COLOR_BGR2HSV)
+        self.table = cv2.inRange(hsv, np.asarray(lower), np.asarray(upper)).reshape(-1)
+        self.key = (tuple(int(v) for v in lower), tuple(int(v) for v in upper))
+
+    def mask(self, bgr, lower, upper):
+        key = (tuple(int(v) for v in lower), tuple(int(v) for v in upper))
+        if key != self.key:
+            self.build(lower, upper)
+
+        q = bgr >> self.shift
+        idx = q[..., 0].astype(self.index_dtype)
+        idx <<= self.bits
+        idx |= q[..., 1]
+        idx <<= self.bits
+        idx |= q[..., 2]
+        return self.table[idx]
@@ -0,0 +1,69 @@
+import threading
+
+
+# ============================================================
+#  REGISTR DETEKTORŮ – jedna instance na proces a (typ, parametry)
+#   Módy se při SET MODE vytváří znovu, detektory ne: nativní
+#   inicializace se platí jednou a uvolní se až při vypnutí.
+# ============================================================
+_factories = {}      # typ → (factory(**params), close(detector) | None)
+_instances = {}      # (typ, parametry) → detektor
+_lock = threading.Lock()
+
+
+def register(kind, factory, close=None):
+    """Modul detektoru zaregistruje, jak instanci vytvořit (a případně zavřít)."""
+    _factories[kind] = (factory, close)
+
+
+def _key(kind, params):
+    return kind, tuple(sorted(params.items()))
+
+
+def get(kind, **params):
+    """Detektor daného typu a parametrů – vytvoří se při prvním použití."""
+    key = _key(kind, params)
+    det = _instances.get(key)
+    if det is not None:
+        return det
+
+    # detect vlákno a prewarm se můžou potkat – vytvářet jen jednou
+    with _lock:
+        det = _instances.get(key)
+        if det is None:
+            factory, _ = _factories[kind]
+            det = factory(**params)
+            _instances[key] = det
+    return det
+
+
+def prewarm(specs, log=None):
+    """specs = [(typ, parametry), ...]; chyby jen zaloguje, detektor se zkusí znovu líně."""
+    for kind, params in specs:
+        try:
+            get(kind, **params)
+        except Exception as e:
+            if log is not None:
+                log.warn(f"Prewarm {kind} {params} selhal: {e}")
+
+
+def close_all():
+    with _lock:
+        items = list(_instances.items())
+        _instances.clear()
+
+    for (kind, _), det in items:
+        _, close = _factories.get(kind, (None, None))
+        if close is not None:
+            try:
+                close(det)
+            except Exception:
+                pass
+
+
+def stats():
+    with _lock:
+        return [
+            {"type": kind, "params": dict(params)}
+            for kind, params in _instances
+        ]
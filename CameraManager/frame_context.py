@@ -0,0 +1,67 @@
+import time
+
+import cv2
+
+
+class FrameContext:
+    """
+    Snímek + líně počítané mezivýsledky (gray, HSV, zmenšeniny).
+    Víc detektorů nad jedním snímkem si je tak spočítá jen jednou.
+    """
+
+    def __init__(self, frame):
+        self.frame = frame
+        self._gray = None
+        self._hsv = None
+        self._pyr = {0: frame}
+        self._gray_pyr = {}
+
+        # čas strávený převody barev a zmenšováním – pro časovače módu
+        self.convert_ms = 0.0
+
+    def _timed(self, fn, *args):
+        t0 = time.monotonic()
+        out = fn(*args)
+        self.convert_ms += (time.monotonic() - t0) * 1000.0
+        return out
+
+    @staticmethod
+    def wrap(frame):
+        # detektory berou snímek i kontext – benchmark a VisionPool posílají holý snímek
+        return frame if isinstance(frame, FrameContext) else FrameContext(frame)
+
+    @property
+    def shape(self):
+        return self.frame.shape
+
+    @property
+    def gray(self):
+        if self._gray is None:
+            self._gray = self._timed(cv2.cvtColor, self.frame, cv2.COLOR_BGR2GRAY)
+        return self._gray
+
+    @property
+    def hsv(self):
+        if self._hsv is None:
+            self._hsv = self._timed(cv2.cvtColor, self.frame, cv2.COLOR_BGR2HSV)
+        return self._hsv
+
+    def hsv_roi(self, x0, y0, x1, y1):
+        """HSV jen pro výřez – z cache, pokud už je celý snímek převedený."""
+        if self._hsv is not None:
+            return self._hsv[y0:y1, x0:x1]
+        return self._timed(cv2.cvtColor, self.frame[y0:y1, x0:x1], cv2.COLOR_BGR2HSV)
+
+    def pyr(self, level):
+        """BGR zmenšený 2^level krát (cv2.pyrDown)."""
+        if level not in self._pyr:
+            self._pyr[level] = self._timed(cv2.pyrDown, self.pyr(level - 1))
+        return self._pyr[level]
+
+    def gray_pyr(self, level):
+        """Grayscale zmenšený 2^level krát."""
+        if level == 0:
+            return self.gray
+        if level not in self._gray_pyr:
+            self._gray_pyr[level] = self._timed(cv2.pyrDown, self.gray_pyr(level - 1))
+        return self._gray_pyr[level]
@@ -0,0 +1,168 @@
+import asyncio
+import threading
+import time
+
+import cv2
+
+
+# V4L2 read() na zaseknuté kameře visí až ~10 s – tak dlouho na vlákno nečekáme
+STOP_TIMEOUT = 1.0  # s
+
+
+class FrameSource:
+    """Čte snímky z kamery ve vlastním vlákně a drží jen ten nejnovější."""
+
+    def __init__(self, cap, log):
+        self.cap = cap
+        self.log = log
+
+        self._lock = threading.Lock()
+        self._frame = None
+        self._timestamp = 0.0
+        self._seq = 0
+
+        self._loop = None
+        self._new_frame = None
+        self._thread = None
+        self._release_on_exit = False
+        self.running = False
+
+        self.update_size()
+
+    def update_size(self):
+        # po změně profilu – starý snímek už má jiný rozměr, zahodíme ho
+        self.frame_w = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.frame_h = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        with self._lock:
+            self._frame = None
+
+    # ---------------------------------------------------------
+    #  START / STOP
+    # ---------------------------------------------------------
+    def start(self):
+        """False = staré grab vlákno pořád visí v read(), druhé by četlo stejný cap."""
+        if self.running:
+            return True
+        if self.stalled:
+            self.log.warn("Grab vlákno ještě neskončilo, FrameSource nespouštím.")
+            return False
+
+        self._loop = asyncio.get_running_loop()
+        self._new_frame = asyncio.Event()
+        self.running = True
+
+        self._thread = threading.Thread(
+            target=self._grab_loop, name="FrameSource", daemon=True
+        )
+        self._thread.start()
+        return True
+
+    @property
+    def stalled(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def stop(self, timeout=STOP_TIMEOUT):
+        """True = grab vlákno skončilo a s cap se dá bezpečně pracovat."""
+        self.running = False
+
+        if self._thread:
+            self._thread.join(timeout=timeout)
+            if self._thread.is_alive():
+                self.log.warn(f"Grab vlákno neskončilo do {timeout:.1f} s (kamera visí v read()).")
+            else:
+                self._thread = None
+
+        # probudíme případné čekající – stop() běží i z executoru, Event není thread-safe
+        if self._loop is not None:
+            try:
+                self._loop.call_soon_threadsafe(self._notify)
+            except RuntimeError:
+                # event loop už neběží
+                pass
+
+        return self._thread is None
+
+    def release(self):
+        if not self.stop():
+            # release() uprostřed read() umí shodit proces – uvolní ho vlákno, až read() vrátí
+            self._release_on_exit = True
+            if self.stalled:
+                self.cap = None
+                return
+            # vlákno mezitím skončilo a příznak už neuvidí
+
+        if self.cap:
+            try:
+                self.cap.release()
+            except:
+                pass
+            self.cap = None
+
+    # ---------------------------------------------------------
+    #  GRAB VLÁKNO – blokující cap.read() mimo asyncio
+    # ---------------------------------------------------------
+    def _grab_loop(self):
+        cap = self.cap
+        fails = 0
+
+        while self.running:
+            ok, frame = cap.read()
+            ts = time.monotonic()
+
+            if not ok:
+                fails += 1
+                if fails == 30:
+                    self.log.warn("Kamera nevrací snímky.")
+                time.sleep(0.01)
+                continue
+
+            fails = 0
+
+            with self._lock:
+                self._frame = frame
+                self._timestamp = ts
+                self._seq += 1
+
+            try:
+                self._loop.call_soon_threadsafe(self._notify)
+            except RuntimeError:
+                # event loop už neběží
+                break
+
+        if self._release_on_exit:
+            try:
+                cap.release()
+            except:
+                pass
+
+    def _notify(self):
+        self._new_frame.set()
+
+    # ---------------------------------------------------------
+    #  ČTENÍ
+    # ---------------------------------------------------------
+    def latest(self):
+        """Neblokující – vrátí (frame, capture_timestamp, seq) posledního snímku."""
+        with self._lock:
+            return self._frame, self._timestamp, self._seq
+
+    async def next_frame(self, after_seq, timeout=1.0):
+        """Počká na snímek novější než after_seq. Při timeoutu vrátí (None, 0.0, after_seq)."""
+        deadline = time.monotonic() + timeout
+
+        while self.running:
+            frame, ts, seq = self.latest()
+            if seq > after_seq and frame is not None:
+                return frame, ts, seq
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+
+            self._new_frame.clear()
+            try:
+                await asyncio.wait_for(self._new_frame.wait(), remaining)
+            except asyncio.TimeoutError:
+                break
+
+        return None, 0.0, after_seq
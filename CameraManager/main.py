@@ -1,5 +1,7 @@
 import asyncio
+import json
 import socket
+import time
 import os
 import sys
 import zmq
@@ -12,20 +14,43 @@ from ProgramManager.ports import (
     PROGRAM_SELECT_PORT,
     CAMERA_DATA_PORT,
     PREVIEW_PORT,
+    PREVIEW_CTRL_PORT,
+    CLOCK_SYNC_PORT,
     ROBORIO_IP,
 )
 
 from Modes.detect_ball import DetectBall
 from Modes.apriltag import AprilTag
 from Modes.detect_qrcode import QRCodeMode
+from Modes.composite import CompositeMode, MODES as COMPOSITE_MODES
 
+import detector_registry
 from camera_bus import CameraBus
+from camera_service import CameraService
+from clock_sync import ClockSync
+from vision_pool import VisionPool
+from preview_shm import PreviewWriter
+from preview_demand import PreviewDemand
+
+
+# počet procesů pro detekci, 0 = detekce přímo v CameraManageru
+VISION_WORKERS = 0
+
+# preview přes sdílenou paměť (raw snímky) místo UDP JPEG
+PREVIEW_SHM = True
+
+# detektory vytvořit hned při startu, první SET MODE pak neplatí jejich inicializaci
+PREWARM_DETECTORS = True
+
+# odhad offsetu hodin vůči RoboRIO – časy v paketech pak jsou v čase robota
+CLOCK_SYNC = True
 
 
 class CameraManager:
     def __init__(self):
         self.log = Logger("CameraManager")
         self.current_mode = None
+        self.last_switch_ms = None
 
         self.CAMERA_DATA_PORT = CAMERA_DATA_PORT
         self.PREVIEW_PORT = PREVIEW_PORT
@@ -34,6 +59,8 @@ class CameraManager:
         # UDP
         self.udp_out = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         self.preview_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.preview_shm = PreviewWriter() if PREVIEW_SHM else None
+        self.preview_demand = PreviewDemand(Logger("PreviewDemand"))
 
         # ZMQ pro příjem
         self.ctx = zmq.asyncio.Context()
@@ -43,14 +70,58 @@ class CameraManager:
 
         self.bus = CameraBus("CameraBus")
 
+        # kamera zůstává otevřená přes všechna přepnutí módu
+        self.camera = CameraService(Logger("CameraService"))
+        self.pool = None
+
+        self.clock = (
+            ClockSync(Logger("ClockSync"), (ROBORIO_IP, CLOCK_SYNC_PORT))
+            if CLOCK_SYNC else None
+        )
+
     async def run(self):
 
         asyncio.create_task(self.listen_commands())
         asyncio.create_task(self.listen_messenger())
+        asyncio.create_task(self.listen_preview_demand())
+        if self.clock:
+            asyncio.create_task(self.clock.run())
+
+        # otevřeme kameru hned, první SET MODE pak nečeká na V4L2
+        if not await self.camera.open():
+            self.log.warn("Kamera při startu nedostupná, zkusím znovu při SET MODE.")
+
+        if VISION_WORKERS > 0:
+            self.pool = VisionPool(VISION_WORKERS, Logger("VisionPool"))
+
+        if PREWARM_DETECTORS:
+            await self.prewarm_detectors()
 
         self.log.info("CameraManager ready.")
-        while True:
-            await asyncio.sleep(1)
+        try:
+            while True:
+                await asyncio.sleep(1)
+        finally:
+            if self.current_mode:
+                await self.current_mode.stop()
+            if self.pool:
+                self.pool.close()
+            if self.preview_shm:
+                self.preview_shm.close()
+            await self.camera.close()
+            detector_registry.close_all()
+            if self.clock:
+                self.clock.close()
+
+    async def prewarm_detectors(self):
+        specs = []
+        for cls in (DetectBall, AprilTag, QRCodeMode):
+            specs += cls.prewarm_specs(self)
+
+        t0 = time.monotonic()
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, detector_registry.prewarm, specs, self.log)
+        self.log.info(f"Detektory připraveny za {(time.monotonic() - t0) * 1000.0:.1f} ms")
 
     async def listen_commands(self):
         sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
@@ -63,7 +134,52 @@ class CameraManager:
             data, addr = await loop.run_in_executor(None, sock.recvfrom, 1024)
             msg = data.decode().strip().upper()
             self.log.info(f"CMD: {msg}")
-            await self.set_mode(msg)
+
+            if msg.startswith("SET WORKERS "):
+                await self.set_workers(msg)
+            else:
+                await self.set_mode(msg)
+
+    async def listen_preview_demand(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.bind(("127.0.0.1", PREVIEW_CTRL_PORT))
+
+        self.log.info(f"Preview demand on UDP {PREVIEW_CTRL_PORT}")
+        loop = asyncio.get_running_loop()
+
+        while True:
+            data, addr = await loop.run_in_executor(None, sock.recvfrom, 1024)
+            try:
+                self.preview_demand.update(json.loads(data.decode()))
+            except Exception as e:
+                self.log.warn(f"Neplatná preview poptávka: {e}")
+
+    async def set_workers(self, msg):
+        try:
+            workers = int(msg.replace("SET WORKERS ", ""))
+        except ValueError:
+            self.log.warn(f"Neplatný příkaz: {msg}")
+            return
+
+        workers = max(0, min(workers, os.cpu_count() or 1))
+
+        # mód se musí zastavit, jinak by mu pool zmizel pod rukama
+        mode = self.current_mode
+        if mode:
+            await mode.stop()
+            self.current_mode = None
+
+        if self.pool:
+            self.pool.close()
+            self.pool = None
+
+        if workers > 0:
+            self.pool = VisionPool(workers, Logger("VisionPool"))
+        else:
+            self.log.info("Detekce běží v hlavním procesu.")
+
+        if mode:
+            await self.set_mode(f"SET MODE {mode.name}")
 
     async def set_mode(self, msg):
         if not msg.startswith("SET MODE "):
@@ -71,6 +187,7 @@ class CameraManager:
             return
 
         mode = msg.replace("SET MODE ", "")
+        t0 = time.monotonic()
 
         if self.current_mode:
             self.log.info(f"Zastavuji {self.current_mode.name}")
@@ -85,6 +202,10 @@ class CameraManager:
         elif mode == "QRCODE":
             self.current_mode = QRCodeMode(self)
 
+        # víc detektorů nad jedním snímkem, např. DETECTBALL+APRILTAG
+        elif "+" in mode and all(m in COMPOSITE_MODES for m in mode.split("+")):
+            self.current_mode = CompositeMode(self, mode.split("+"))
+
         else:
             self.log.warn(f"Neznámý mód {mode}, nic nespouštím.")
             self.current_mode = None
@@ -93,6 +214,9 @@ class CameraManager:
         self.log.info(f"Přepínám režim → {self.current_mode.name}")
         await self.current_mode.start()
 
+        self.last_switch_ms = (time.monotonic() - t0) * 1000.0
+        self.log.info(f"Přepnuto na {self.current_mode.name} za {self.last_switch_ms:.1f} ms")
+
     async def listen_messenger(self):
         self.log.info("ZMQ listener ready.")
 
@@ -106,7 +230,33 @@ class CameraManager:
                     continue
 
                 if cmd == "get_status":
-                    resp = {"mode": self.current_mode.name if self.current_mode else "NONE"}
+                    resp = {
+                        "mode": self.current_mode.name if self.current_mode else "NONE",
+                        "camera_open": self.camera.is_open,
+                        "capture": self.camera.negotiated,
+                        "switch_ms": self.last_switch_ms,
+                        "pool": self.pool.stats() if self.pool else None,
+                        "detectors": detector_registry.stats(),
+                        "clock": self.clock.stats() if self.clock else None,
+                        "stages": (
+                            self.current_mode.pipeline_stats()
+                            if self.current_mode else None
+                        ),
+                    }
+
+                elif cmd == "get_stats":
+                    resp = {
+                        "mode": self.current_mode.name if self.current_mode else "NONE",
+                        "timings": (
+                            self.current_mode.timing_stats()
+                            if self.current_mode else None
+                        ),
+                        "pool": self.pool.stats() if self.pool else None,
+                    }
+
+                elif cmd == "preview_demand":
+                    self.preview_demand.update(msg)
+                    resp = {"preview": self.preview_demand.active()}
 
                 else:
                     resp = {"error": "Unknown command"}
@@ -0,0 +1,78 @@
+import time
+
+import cv2
+import numpy as np
+
+
+# pixel zmenšeniny je "změněný", když se některý kanál BGR liší o víc než GATE_PIXEL_DIFF;
+# snímek je "stejný", když je změněných pixelů méně než GATE_THRESHOLD (podíl).
+# Průměr přes celý snímek malý míč nebo vzdálený tag utopí – 1000 px míč
+# je na 80x60 zmenšenině ~15 px, tj. 0.3 % plochy.
+GATE_PIXEL_DIFF = 20
+GATE_THRESHOLD = 0.001
+# nejdéle tak dlouho se smí použít starý výsledek – pak se detekuje vždy
+GATE_REFRESH_S = 0.5
+GATE_SIZE = (80, 60)
+
+
+class MotionGate:
+    """
+    Levný detektor změny před detekcí: zmenšenina snímku proti zmenšenině
+    posledního snímku, který opravdu prošel detekcí. Drift se tak sčítá
+    a pomalá změna scény se nepropásne.
+    """
+
+    def __init__(self, threshold=GATE_THRESHOLD, refresh_s=GATE_REFRESH_S, size=GATE_SIZE,
+                 pixel_diff=GATE_PIXEL_DIFF):
+        self.threshold = threshold
+        self.pixel_diff = pixel_diff
+        self.refresh_s = refresh_s
+        self.size = size
+
+        self.reference = None
+        self.reference_t = 0.0
+        self.diff = 0.0
+
+        self.checked = 0
+        self.skipped = 0
+
+    def _thumb(self, frame):
+        # barevně – červený míč má v šedi skoro stejný jas jako koberec
+        return cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA)
+
+    def _changed_fraction(self, thumb):
+        diff = cv2.absdiff(thumb, self.reference)
+        if diff.ndim == 3:
+            diff = diff.max(axis=2)
+        return np.count_nonzero(diff > self.pixel_diff) / diff.size
+
+    def static(self, frame):
+        """True = snímek se od poslední detekce nezměnil, stačí starý výsledek."""
+        self.checked += 1
+        thumb = self._thumb(frame)
+        now = time.monotonic()
+
+        if self.reference is not None and now - self.reference_t < self.refresh_s:
+            self.diff = self._changed_fraction(thumb)
+            if self.diff < self.threshold:
+                self.skipped += 1
+                return True
+
+        self.reference = thumb
+        self.reference_t = now
+        return False
+
+    def invalidate(self):
+        """Referenční snímek detekcí neprošel (zahozen) – příště detekovat."""
+        self.reference = None
+
+    def stats(self):
+        return {
+            "threshold": self.threshold,
+            "pixel_diff": self.pixel_diff,
+            "refresh_s": self.refresh_s,
+            "diff": round(self.diff, 4),
+            "checked": self.checked,
+            "skipped": self.skipped,
+            "skip_rate": round(self.skipped / self.checked, 3) if self.checked else 0.0,
+        }
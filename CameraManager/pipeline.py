@@ -0,0 +1,112 @@
+import asyncio
+import collections
+import inspect
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from stage_timer import StageTimer
+
+
+class FrameJob:
+    """Jeden snímek putující pipeline – každá stage doplní svůj kus."""
+
+    __slots__ = ("seq", "ts", "frame", "result", "preview", "quality", "jpg")
+
+    def __init__(self, seq, ts, frame):
+        self.seq = seq
+        self.ts = ts
+        self.frame = frame
+        self.result = None
+        self.preview = None
+        self.quality = None
+        self.jpg = None
+
+
+class DropOldestQueue:
+    """Omezená fronta – když je plná, nejstarší položka se zahodí a nový snímek projde."""
+
+    def __init__(self, maxsize=1):
+        self._items = collections.deque(maxlen=maxsize)
+        self._ready = asyncio.Event()
+        self.dropped = 0
+
+    @property
+    def depth(self):
+        return len(self._items)
+
+    def put(self, item):
+        if len(self._items) == self._items.maxlen:
+            self.dropped += 1
+        self._items.append(item)
+        self._ready.set()
+
+    async def get(self):
+        while not self._items:
+            self._ready.clear()
+            await self._ready.wait()
+        return self._items.popleft()
+
+
+class Stage:
+    """
+    Jedna stage pipeline: vezme položku ze vstupní fronty, zpracuje ji a pošle dál.
+    Synchronní fn běží ve vlastním vlákně (cv2 uvolňuje GIL), async fn přímo v event loopu.
+    """
+
+    def __init__(self, name, fn, inq, outqs=()):
+        self.name = name
+        self.fn = fn
+        self.inq = inq
+        self.outqs = list(outqs)
+        self.is_async = inspect.iscoroutinefunction(fn)
+
+        self.executor = None
+        self.count = 0
+        self.errors = 0
+        self.timer = StageTimer()
+
+    async def run(self, log):
+        loop = asyncio.get_running_loop()
+        if not self.is_async:
+            self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=self.name)
+
+        try:
+            while True:
+                item = await self.inq.get()
+
+                t0 = time.monotonic()
+                try:
+                    if self.is_async:
+                        out = await self.fn(item)
+                    else:
+                        out = await loop.run_in_executor(self.executor, self.fn, item)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    self.errors += 1
+                    log.warn(f"Stage {self.name} error: {e}")
+                    continue
+
+                # doba obsluhy do kruhového bufferu – percentily až při dotazu
+                now = time.monotonic()
+                self.timer.record((now - t0) * 1000.0, now)
+                self.count += 1
+
+                if out is not None:
+                    for q in self.outqs:
+                        q.put(out)
+        finally:
+            if self.executor:
+                # počkat na rozběhnutý snímek – detektor z registry sdílí i další mód,
+                # staré vlákno nesmí běžet souběžně s novým
+                executor, self.executor = self.executor, None
+                await loop.run_in_executor(None, executor.shutdown)
+
+    def stats(self):
+        return {
+            "queue": self.inq.depth,
+            "dropped": self.inq.dropped,
+            "count": self.count,
+            "errors": self.errors,
+            **self.timer.stats(),
+        }
@@ -0,0 +1,88 @@
+import json
+import threading
+import time
+
+
+# ============================================================
+#  POPTÁVKA PO PREVIEW
+#  Konzument (web preview, DisplayManager) si preview "pronajme" na ttl
+#  sekund a lease průběžně obnovuje. Bez platného lease módy preview
+#  vůbec nekreslí ani nekódují.
+#
+#  zpráva (JSON přes UDP / messenger):
+#    {"consumer": "web_preview", "width": 640, "height": 480,
+#     "quality": 80, "fps": 15, "ttl": 3}
+#  width/height 0 = nativní rozlišení, ttl 0 = konec poptávky
+# ============================================================
+DEFAULT_TTL = 3.0
+DEFAULT_QUALITY = 80
+DEFAULT_FPS = 15.0
+MAX_FPS = 60.0
+
+
+def merge_size(values):
+    """Sloučení width/height: 0 = nativní, tedy největší – jinak maximum."""
+    values = list(values)
+    return 0 if 0 in values else max(values)
+
+
+class PreviewDemand:
+    def __init__(self, log=None):
+        self.log = log
+        self.leases = {}
+        # active() se volá i z vlákna annotate stage
+        self._lock = threading.Lock()
+
+    def update(self, msg):
+        consumer = str(msg.get("consumer", "unknown"))
+        ttl = float(msg.get("ttl", DEFAULT_TTL))
+
+        with self._lock:
+            if ttl <= 0:
+                if self.leases.pop(consumer, None) is not None and self.log:
+                    self.log.info(f"Preview demand released by {consumer}")
+                return
+
+            if consumer not in self.leases and self.log:
+                self.log.info(f"Preview demand from {consumer}")
+
+            self.leases[consumer] = {
+                "width": max(0, int(msg.get("width", 0))),
+                "height": max(0, int(msg.get("height", 0))),
+                "quality": min(100, max(10, int(msg.get("quality", DEFAULT_QUALITY)))),
+                "fps": min(MAX_FPS, max(0.1, float(msg.get("fps", DEFAULT_FPS)))),
+                "expires": time.monotonic() + ttl,
+            }
+
+    def active(self):
+        """Sloučená poptávka všech živých konzumentů, nebo None když se nikdo nedívá."""
+        now = time.monotonic()
+        with self._lock:
+            for consumer in [c for c, d in self.leases.items() if d["expires"] < now]:
+                del self.leases[consumer]
+                if self.log:
+                    self.log.info(f"Preview demand from {consumer} expired")
+
+            if not self.leases:
+                return None
+
+            leases = list(self.leases.values())
+
+        return {
+            "width": merge_size(d["width"] for d in leases),
+            "height": merge_size(d["height"] for d in leases),
+            "quality": max(d["quality"] for d in leases),
+            "fps": max(d["fps"] for d in leases),
+        }
+
+
+def encode_request(consumer, width=0, height=0, quality=DEFAULT_QUALITY,
+                   fps=DEFAULT_FPS, ttl=DEFAULT_TTL):
+    return json.dumps({
+        "consumer": consumer,
+        "width": width,
+        "height": height,
+        "quality": quality,
+        "fps": fps,
+        "ttl": ttl,
+    }).encode()
@@ -0,0 +1,134 @@
+import struct
+import time
+
+
+# ============================================================
+#  PREVIEW PŘES UDP PO KOUSCÍCH
+#  Každý datagram = hlavička + max. CHUNK_PAYLOAD bajtů JPEGu,
+#  takže se vejde do MTU a žádný snímek neprasne na limitu UDP.
+# ============================================================
+MAGIC = b"PVF1"
+# magic, frame_id, chunk_index, chunk_count, timestamp
+HEADER_FMT = "<4sIHHd"
+HEADER_SIZE = struct.calcsize(HEADER_FMT)
+
+# 1500 MTU − IP (20) − UDP (8) − hlavička, s rezervou
+CHUNK_PAYLOAD = 1400
+MAX_CHUNKS = 0xFFFF
+# skok frame_id o víc snímků zpět = odesílatel se restartoval a čísluje od nuly
+RESTART_WINDOW = 64
+
+
+def fragment(frame_id, ts, data):
+    """Rozseká JPEG na datagramy. Vrací seznam bytes."""
+    count = max(1, (len(data) + CHUNK_PAYLOAD - 1) // CHUNK_PAYLOAD)
+    if count > MAX_CHUNKS:
+        raise ValueError(f"Preview frame too large ({len(data)} B)")
+
+    frame_id &= 0xFFFFFFFF
+    return [
+        struct.pack(HEADER_FMT, MAGIC, frame_id, i, count, ts)
+        + data[i * CHUNK_PAYLOAD:(i + 1) * CHUNK_PAYLOAD]
+        for i in range(count)
+    ]
+
+
+def _newer(a, b):
+    # porovnání frame_id s přetečením přes 2^32
+    return a != b and ((a - b) & 0xFFFFFFFF) < 0x80000000
+
+
+class _Partial:
+    __slots__ = ("count", "chunks", "received", "ts", "first_seen")
+
+    def __init__(self, count, ts, now):
+        self.count = count
+        self.chunks = [None] * count
+        self.received = 0
+        self.ts = ts
+        self.first_seen = now
+
+
+class PreviewReassembler:
+    """
+    Skládá snímky z kousků. Neúplné snímky po timeoutu (nebo když přijde novější celý) zahodí.
+    Skok frame_id zpět o víc než RESTART_WINDOW bere jako restart odesílatele a začne znovu.
+    """
+
+    def __init__(self, timeout=0.5):
+        self.timeout = timeout
+        self.partials = {}
+        self.last_complete = None
+
+        self.frames_complete = 0
+        self.frames_lost = 0
+        self.chunks_received = 0
+        self.bad_packets = 0
+        self.restarts = 0
+
+    def feed(self, packet, now=None):
+        """Vrací (frame_id, timestamp, data) pro dokončený snímek, jinak None."""
+        now = time.monotonic() if now is None else now
+
+        if len(packet) < HEADER_SIZE or packet[:4] != MAGIC:
+            self.bad_packets += 1
+            return None
+
+        _, frame_id, index, count, ts = struct.unpack_from(HEADER_FMT, packet)
+        if count == 0 or index >= count:
+            self.bad_packets += 1
+            return None
+
+        self.chunks_received += 1
+        self._expire(now)
+
+        if self.last_complete is not None and not _newer(frame_id, self.last_complete):
+            if (self.last_complete - frame_id) & 0xFFFFFFFF <= RESTART_WINDOW:
+                # opožděný kousek snímku, který už máme za sebou
+                return None
+            self._reset()
+
+        part = self.partials.get(frame_id)
+        if part is None:
+            part = _Partial(count, ts, now)
+            self.partials[frame_id] = part
+
+        if part.chunks[index] is None:
+            part.chunks[index] = packet[HEADER_SIZE:]
+            part.received += 1
+
+        if part.received < part.count:
+            return None
+
+        del self.partials[frame_id]
+        self.last_complete = frame_id
+        self.frames_complete += 1
+
+        # starší nedokončené snímky už nikdy nepoužijeme
+        for fid in [f for f in self.partials if not _newer(f, frame_id)]:
+            del self.partials[fid]
+            self.frames_lost += 1
+
+        return frame_id, part.ts, b"".join(part.chunks)
+
+    def _reset(self):
+        self.frames_lost += len(self.partials)
+        self.partials.clear()
+        self.last_complete = None
+        self.restarts += 1
+
+    def _expire(self, now):
+        for fid in [f for f, p in self.partials.items() if now - p.first_seen > self.timeout]:
+            del self.partials[fid]
+            self.frames_lost += 1
+
+    def stats(self):
+        total = self.frames_complete + self.frames_lost
+        return {
+            "frames_complete": self.frames_complete,
+            "frames_lost": self.frames_lost,
+            "loss": self.frames_lost / total if total else 0.0,
+            "chunks_received": self.chunks_received,
+            "bad_packets": self.bad_packets,
+            "restarts": self.restarts,
+        }
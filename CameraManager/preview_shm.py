@@ -0,0 +1,158 @@
+import mmap
+import os
+import struct
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+# ============================================================
+#  SDÍLENÝ PREVIEW KANÁL
+#  hlavička + 2 buffery; zápis chráněný seqlockem:
+#    seq liché  = zapisuje se
+#    seq sudé   = data konzistentní, platí buffer "active"
+#  Writer píše vždy do neaktivního bufferu, čtenář tak čte v klidu,
+#  dokud writer nezačne přepisovat jeho buffer (seq o víc než 2 dál).
+# ============================================================
+PREVIEW_SHM_NAME = "frc_camera_preview"
+
+MAX_WIDTH = 1280
+MAX_HEIGHT = 720
+CHANNELS = 3
+
+MAGIC = b"PRV1"
+# magic, seq, active, width, height, channels, frame_seq, timestamp
+HEADER_FMT = "<4sQIIIIQd"
+HEADER_SIZE = 64
+SEQ_OFFSET = 4
+META_FMT = "<IIIIQd"
+META_OFFSET = 12
+# writer mohl být restartován (nový segment) – po téhle době bez snímku se mapujeme znovu
+REOPEN_AFTER = 2.0  # s
+
+BUF_SIZE = MAX_WIDTH * MAX_HEIGHT * CHANNELS
+TOTAL_SIZE = HEADER_SIZE + 2 * BUF_SIZE
+
+
+class PreviewWriter:
+    """Strana CameraManageru – vlastní segment a zapisuje do něj raw BGR snímky."""
+
+    def __init__(self, name=PREVIEW_SHM_NAME):
+        # po pádu může segment zůstat viset
+        try:
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+        except FileNotFoundError:
+            pass
+
+        self.shm = shared_memory.SharedMemory(name=name, create=True, size=TOTAL_SIZE)
+        self.buf = self.shm.buf
+        self.seq = 0
+        self.active = 0
+        struct.pack_into(HEADER_FMT, self.buf, 0, MAGIC, 0, 0, 0, 0, 0, 0, 0.0)
+
+    def _set_seq(self, seq):
+        self.seq = seq
+        struct.pack_into("<Q", self.buf, SEQ_OFFSET, seq)
+
+    def write(self, frame, frame_seq=0, ts=None):
+        h, w = frame.shape[:2]
+        channels = 1 if frame.ndim == 2 else frame.shape[2]
+        if frame.nbytes > BUF_SIZE:
+            return False
+
+        target = 1 - self.active
+        offset = HEADER_SIZE + target * BUF_SIZE
+
+        # seq → liché: čtenář ví, že probíhá zápis
+        self._set_seq(self.seq + 1)
+
+        dst = np.ndarray(frame.shape, np.uint8, buffer=self.buf, offset=offset)
+        dst[...] = frame
+        del dst
+
+        # nejdřív metadata, seq až úplně nakonec
+        self.active = target
+        struct.pack_into(
+            META_FMT, self.buf, META_OFFSET,
+            self.active, w, h, channels, frame_seq,
+            ts if ts is not None else time.monotonic(),
+        )
+        self._set_seq(self.seq + 1)
+        return True
+
+    def close(self):
+        self.buf = None
+        try:
+            self.shm.close()
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class PreviewReader:
+    """Strana konzumenta – segment mapuje jen pro čtení (web preview, DisplayManager)."""
+
+    def __init__(self, name=PREVIEW_SHM_NAME):
+        self.name = name
+        self.mm = None
+        self.last_seq = 0
+        self.last_new = 0.0
+
+    def open(self):
+        if self.mm is not None:
+            return True
+        try:
+            fd = os.open(f"/dev/shm/{self.name}", os.O_RDONLY)
+        except FileNotFoundError:
+            return False
+        try:
+            self.mm = mmap.mmap(fd, TOTAL_SIZE, access=mmap.ACCESS_READ)
+        finally:
+            os.close(fd)
+        self.last_new = time.monotonic()
+        return True
+
+    def _header(self):
+        return struct.unpack_from(HEADER_FMT, self.mm, 0)
+
+    def read(self, only_new=True):
+        """
+        Vrátí (frame, frame_seq, timestamp) nebo None, když není nový konzistentní snímek.
+        Snímek je vlastní kopie, segment se dál může měnit.
+        """
+        if not self.open():
+            return None
+
+        magic, seq1, active, w, h, channels, frame_seq, ts = self._header()
+        if magic != MAGIC or seq1 % 2 or w == 0:
+            return None
+        if only_new and seq1 == self.last_seq:
+            if time.monotonic() - self.last_new > REOPEN_AFTER:
+                self.close()
+            return None
+
+        # metadata jsme mohli chytit uprostřed zápisu
+        if struct.unpack_from("<Q", self.mm, SEQ_OFFSET)[0] != seq1:
+            return None
+
+        shape = (h, w) if channels == 1 else (h, w, channels)
+        offset = HEADER_SIZE + active * BUF_SIZE
+        src = np.ndarray(shape, np.uint8, buffer=self.mm, offset=offset)
+        frame = src.copy()
+
+        # writer mezitím mohl dokončit max. jeden zápis – ten šel do druhého bufferu
+        seq2 = struct.unpack_from("<Q", self.mm, SEQ_OFFSET)[0]
+        if seq2 - seq1 > 2:
+            return None
+
+        self.last_seq = seq1
+        self.last_new = time.monotonic()
+        return frame, frame_seq, ts
+
+    def close(self):
+        if self.mm is not None:
+            self.mm.close()
+            self.mm = None
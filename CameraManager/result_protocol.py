@@ -0,0 +1,99 @@
+"""
+Binární výsledkový protokol CameraManager → RoboRIO (UDP CAMERA_DATA_PORT).
+
+Paket = hlavička + count záznamů, vše little-endian:
+
+  hlavička (28 B)
+    magic       4s   b"FRCR"
+    version     u8   PROTOCOL_VERSION
+    mode        u8   MODE_IDS
+    flags       u16  FLAG_*
+    seq         u32  pořadové číslo snímku z kamery (mezery = zahozené snímky)
+    capture_ts  f64  čas expozice snímku v s (monotonic Pi, s FLAG_ROBOT_TIME čas RoboRIO)
+    latency_ms  f32  od expozice do odeslání
+    count       u16  počet záznamů
+    (2 B zarovnání)
+
+  záznam (56 B)
+    kind        u8   KIND_*
+    (3 B zarovnání)
+    id          i32  ID tagu / pořadí míče nebo QR kódu
+    x, y        f32  offset od středu obrazu v px
+    vx, vy      f32  rychlost v px/s (sledovaný míč), jinak 0
+    size        f32  poloměr míče / strana tagu nebo QR v px
+    area        f32  plocha v px²
+    score       f32  skóre detekce
+    distance    f32  vzdálenost v m, -1 = bez pózy
+    tx, ty, tz  f32  translace v m (kamera: x vpravo, y dolů, z dopředu)
+    yaw         f32  natočení kolem svislé osy ve stupních
+"""
+import struct
+from collections import namedtuple
+
+
+MAGIC = b"FRCR"
+PROTOCOL_VERSION = 1
+
+HEADER = struct.Struct("<4sBBHIdfH2x")
+RECORD = struct.Struct("<B3xi12f")
+
+# ať se paket vejde do jednoho UDP datagramu pod MTU
+MAX_TARGETS = 16
+
+MODE_IDS = {
+    "DETECTBALL": 1,
+    "APRILTAG": 2,
+    "QRCODE": 3,
+    "COMPOSITE": 4,
+}
+MODE_NAMES = {v: k for k, v in MODE_IDS.items()}
+
+KIND_BALL = 1
+KIND_TAG = 2
+KIND_QR = 3
+
+FLAG_ROBOT_TIME = 0x0001    # capture_ts je už přepočtený na čas RoboRIO
+
+
+Target = namedtuple(
+    "Target",
+    "kind id x y vx vy size area score distance tx ty tz yaw",
+    defaults=(0.0, 0.0, 0.0, 0.0, 0.0, -1.0, 0.0, 0.0, 0.0, 0.0),
+)
+
+Header = namedtuple("Header", "version mode flags seq capture_ts latency_ms count")
+
+
+def encode(mode_id, seq, capture_ts, latency_ms, targets=(), flags=0):
+    """Jeden paket pro libovolný mód – pevná hlavička + pevné záznamy. mode_id z MODE_IDS."""
+    targets = list(targets)[:MAX_TARGETS]
+    packet = bytearray(HEADER.size + RECORD.size * len(targets))
+
+    HEADER.pack_into(
+        packet, 0,
+        MAGIC, PROTOCOL_VERSION, mode_id, flags,
+        seq & 0xFFFFFFFF, capture_ts, latency_ms, len(targets),
+    )
+    for i, t in enumerate(targets):
+        RECORD.pack_into(packet, HEADER.size + i * RECORD.size, *t)
+    return bytes(packet)
+
+
+def decode(packet):
+    """Referenční dekodér – (Header, [Target]); ValueError pro cizí nebo poškozený paket."""
+    if len(packet) < HEADER.size:
+        raise ValueError(f"krátký paket ({len(packet)} B)")
+
+    magic, version, mode, flags, seq, capture_ts, latency_ms, count = HEADER.unpack_from(packet)
+    if magic != MAGIC:
+        raise ValueError(f"neznámý magic {magic!r}")
+    if version != PROTOCOL_VERSION:
+        raise ValueError(f"nepodporovaná verze {version}")
+    if len(packet) != HEADER.size + count * RECORD.size:
+        raise ValueError(f"délka {len(packet)} B neodpovídá {count} záznamům")
+
+    targets = [
+        Target(*RECORD.unpack_from(packet, HEADER.size + i * RECORD.size))
+        for i in range(count)
+    ]
+    return Header(version, mode, flags, seq, capture_ts, latency_ms, count), targets
@@ -0,0 +1,43 @@
+import time
+from array import array
+
+
+def _percentile(sorted_values, p):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * p / 100))]
+
+
+class StageTimer:
+    """
+    Kruhový buffer posledních `size` měření (ms + monotonic čas dokončení).
+    Buffery jsou předalokované – record() nic nealokuje, řadí se až při stats().
+    """
+
+    def __init__(self, size=512):
+        self.size = size
+        self._ms = array("d", bytes(8 * size))
+        self._done = array("d", bytes(8 * size))
+        self._i = 0
+        self.count = 0
+
+    def record(self, ms, now=None):
+        i = self._i
+        self._ms[i] = ms
+        self._done[i] = time.monotonic() if now is None else now
+        self._i = (i + 1) % self.size
+        self.count += 1
+
+    def stats(self):
+        n = min(self.count, self.size)
+        if n == 0:
+            return {"p50_ms": None, "p95_ms": None, "p99_ms": None, "max_ms": None, "fps": 0.0}
+
+        ms = sorted(self._ms[:n])
+        done = self._done[:n]
+        span = max(done) - min(done)
+        return {
+            "p50_ms": round(_percentile(ms, 50), 2),
+            "p95_ms": round(_percentile(ms, 95), 2),
+            "p99_ms": round(_percentile(ms, 99), 2),
+            "max_ms": round(ms[-1], 2),
+            "fps": round((n - 1) / span, 1) if span > 0 else 0.0,
+        }
@@ -1,16 +1,56 @@
+"""
+Testovací přijímač výsledků z CameraManageru – dekóduje result_protocol
+a hlídá zahozené / opožděné pakety podle seq.
+
+    python3 test_udp.py
+"""
 import socket
-import struct
+import time
+
+from result_protocol import MODE_NAMES, decode
+
+KINDS = {1: "ball", 2: "tag", 3: "qr"}
 
 sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
 sock.bind(("0.0.0.0", 5800))
 
 print("Listening on UDP 5800...")
 
+last_seq = None
+
 while True:
-    data, addr = sock.recvfrom(1024)
+    data, addr = sock.recvfrom(2048)
+
+    try:
+        header, targets = decode(data)
+    except ValueError as e:
+        print(f"Unknown packet from {addr} ({e}): {data[:32]!r}")
+        continue
+
+    # seq jsou čísla snímků – mezera = snímky bez výsledku, pokles = starý paket
+    gap = ""
+    if last_seq is not None:
+        if header.seq <= last_seq:
+            gap = "  STALE"
+        elif header.seq > last_seq + 1:
+            gap = f"  (+{header.seq - last_seq - 1} frames)"
+    last_seq = max(header.seq, last_seq or 0)
+
+    # age dává smysl jen na Pi (stejné monotonic hodiny) nebo s FLAG_ROBOT_TIME
+    age_ms = (time.monotonic() - header.capture_ts) * 1000.0
+    print(
+        f"FROM {addr}: {MODE_NAMES.get(header.mode, header.mode)} seq={header.seq} "
+        f"latency={header.latency_ms:.1f} ms age={age_ms:.1f} ms "
+        f"targets={header.count}{gap}"
+    )
 
-    if len(data) == 8:
-        x, y = struct.unpack("ff", data)
-        print(f"FROM {addr}: x={x:.2f}, y={y:.2f}")
-    else:
-        print("Unknown packet:", data)
+    for t in targets:
+        line = (
+            f"   {KINDS.get(t.kind, t.kind)} #{t.id}: x={t.x:.2f}, y={t.y:.2f}, "
+            f"size={t.size:.1f}, score={t.score:.2f}"
+        )
+        if t.vx or t.vy:
+            line += f", vx={t.vx:.1f}, vy={t.vy:.1f}"
+        if t.distance >= 0:
+            line += f", dist={t.distance:.2f} m, t=({t.tx:.2f}, {t.ty:.2f}, {t.tz:.2f}), yaw={t.yaw:.1f}"
+        print(line)
@@ -0,0 +1,196 @@
+import math
+import threading
+
+import numpy as np
+
+
+# ============================================================
+#  KALMAN – konstantní rychlost, stav [x, y, vx, vy] v px a px/s
+# ============================================================
+class ConstantVelocityKalman:
+    def __init__(self, x, y, pos_noise=50.0, vel_noise=800.0, meas_noise=4.0):
+        self.s = np.array([x, y, 0.0, 0.0])
+        self.P = np.diag([meas_noise, meas_noise, 1e4, 1e4])
+        self.pos_noise = pos_noise
+        self.vel_noise = vel_noise
+        self.R = np.eye(2) * meas_noise
+        self.H = np.array([[1.0, 0.0, 0.0, 0.0], [0.0, 1.0, 0.0, 0.0]])
+
+    def _predicted(self, dt):
+        F = np.eye(4)
+        F[0, 2] = dt
+        F[1, 3] = dt
+        Q = np.diag([self.pos_noise, self.pos_noise, self.vel_noise, self.vel_noise]) * max(dt, 1e-3)
+        return F @ self.s, F @ self.P @ F.T + Q
+
+    def peek(self, dt):
+        """Predikce bez změny stavu – (x, y, nejistota polohy v px)."""
+        s, P = self._predicted(dt)
+        return s[0], s[1], math.sqrt(max(P[0, 0], P[1, 1]))
+
+    def predict(self, dt):
+        self.s, self.P = self._predicted(dt)
+
+    def update(self, x, y):
+        z = np.array([x, y])
+        y_res = z - self.H @ self.s
+        S = self.H @ self.P @ self.H.T + self.R
+        K = self.P @ self.H.T @ np.linalg.inv(S)
+        self.s = self.s + K @ y_res
+        self.P = (np.eye(4) - K @ self.H) @ self.P
+
+    @property
+    def velocity(self):
+        return float(self.s[2]), float(self.s[3])
+
+
+# ============================================================
+#  SLEDOVÁNÍ MÍČE – okno hledání kolem predikované polohy
+# ============================================================
+class BallTracker:
+    """
+    Po nalezení míče navrhuje výřez (ROI) pro další snímek.
+    Po max_misses ztrátách nebo každých full_scan_every snímků vrátí None = celý snímek.
+    """
+
+    def __init__(self, max_misses=3, full_scan_every=30, margin=2.5, min_half=48):
+        self.max_misses = max_misses
+        self.full_scan_every = full_scan_every
+        self.margin = margin
+        self.min_half = min_half
+
+        self.kf = None
+        self.last_ts = 0.0
+        self.radius = 0.0
+        self.misses = 0
+        self.since_full = 0
+
+        # search_window() volá detect vlákno, update() event loop
+        self._lock = threading.Lock()
+
+    def search_window(self, now, frame_w, frame_h):
+        with self._lock:
+            if (self.kf is None or self.misses >= self.max_misses
+                    or self.since_full >= self.full_scan_every):
+                self.since_full = 0
+                return None
+
+            self.since_full += 1
+            x, y, sigma = self.kf.peek(now - self.last_ts)
+
+        half = max(self.min_half, self.radius * self.margin + 3.0 * sigma)
+        x0 = int(max(0, x - half))
+        y0 = int(max(0, y - half))
+        x1 = int(min(frame_w, x + half))
+        y1 = int(min(frame_h, y + half))
+
+        # predikce utekla mimo obraz
+        if x1 - x0 < 8 or y1 - y0 < 8:
+            return None
+        return x0, y0, x1, y1
+
+    def update(self, ball, ts):
+        with self._lock:
+            if ball is None:
+                self.misses += 1
+                if self.misses >= self.max_misses:
+                    self.kf = None
+                return
+
+            x, y = ball["x"], ball["y"]
+            if self.kf is None:
+                self.kf = ConstantVelocityKalman(x, y)
+            else:
+                self.kf.predict(ts - self.last_ts)
+                self.kf.update(x, y)
+
+            self.last_ts = ts
+            self.radius = ball["circle"][2]
+            self.misses = 0
+
+    @property
+    def active(self):
+        with self._lock:
+            return self.kf is not None
+
+    @property
+    def velocity(self):
+        with self._lock:
+            if self.kf is None or self.misses:
+                return 0.0, 0.0
+            return self.kf.velocity
+
+
+# ============================================================
+#  SLEDOVÁNÍ APRILTAGŮ – detekce jen ve výřezech kolem minulých tagů
+# ============================================================
+class TagTracker:
+    """
+    Po plném skenu navrhuje výřezy kolem rohů nalezených tagů.
+    Plný sken každých full_scan_every snímků, při ztrátě tagu nebo bez tagů.
+    """
+
+    def __init__(self, full_scan_every=15, pad=0.6, min_pad=24):
+        self.full_scan_every = full_scan_every
+        self.pad = pad
+        self.min_pad = min_pad
+
+        self.tags = []              # [(id, corners)] z posledního výsledku
+        self.since_full = 0
+        self.force_full = True
+
+        # search_windows() volá detect vlákno, update() event loop
+        self._lock = threading.Lock()
+
+    def search_windows(self, frame_w, frame_h):
+        with self._lock:
+            if self.force_full or not self.tags or self.since_full >= self.full_scan_every:
+                self.since_full = 0
+                self.force_full = False
+                return None
+
+            self.since_full += 1
+            tags = list(self.tags)
+
+        boxes = []
+        for _, corners in tags:
+            c = np.asarray(corners, np.float32)
+            x0, y0 = c.min(axis=0)
+            x1, y1 = c.max(axis=0)
+            pad = max(self.min_pad, self.pad * max(x1 - x0, y1 - y0))
+            boxes.append([
+                int(max(0, x0 - pad)), int(max(0, y0 - pad)),
+                int(min(frame_w, x1 + pad)), int(min(frame_h, y1 + pad)),
+            ])
+        return merge_boxes(boxes)
+
+    @property
+    def active(self):
+        with self._lock:
+            return bool(self.tags)
+
+    def update(self, tags, rois):
+        with self._lock:
+            ids = {t["id"] for t in tags}
+            # výřezový sken ztratil tag → příště celý snímek
+            if rois is not None and ids != {tid for tid, _ in self.tags}:
+                self.force_full = True
+            self.tags = [(t["id"], t["corners"]) for t in tags]
+
+
+def merge_boxes(boxes):
+    """Překrývající se výřezy sloučí do jednoho, ať se tag nedetekuje dvakrát."""
+    merged = []
+    for b in sorted(boxes):
+        for m in merged:
+            if b[0] < m[2] and m[0] < b[2] and b[1] < m[3] and m[1] < b[3]:
+                m[0], m[1] = min(m[0], b[0]), min(m[1], b[1])
+                m[2], m[3] = max(m[2], b[2]), max(m[3], b[3])
+                break
+        else:
+            merged.append(list(b))
+
+    # sloučení mohlo vytvořit nové překryvy
+    if len(merged) < len(boxes):
+        return merge_boxes(merged)
+    return [tuple(m) for m in merged]
@@ -0,0 +1,227 @@
+import asyncio
+import collections
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+from frame_context import FrameContext
+
+
+# ============================================================
+#  SDÍLENÝ KRUH SNÍMKŮ
+# ============================================================
+class FrameRing:
+    """Předalokované BGR buffery v multiprocessing.shared_memory."""
+
+    def __init__(self, slots, shape):
+        self.slots = slots
+        self.shape = tuple(shape)
+
+        slot_bytes = int(np.prod(self.shape))
+        self.shm = shared_memory.SharedMemory(create=True, size=slot_bytes * slots)
+        self.frames = np.ndarray((slots,) + self.shape, np.uint8, buffer=self.shm.buf)
+
+        self.free = collections.deque(range(slots))
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def acquire(self):
+        return self.free.popleft() if self.free else None
+
+    def release(self, slot):
+        self.free.append(slot)
+
+    def close(self):
+        # numpy view musí zmizet dřív, než se zavře buffer
+        self.frames = None
+        try:
+            self.shm.close()
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+# ============================================================
+#  WORKER (běží v jiném procesu)
+# ============================================================
+_ring_name = None
+_ring_shm = None
+_ring_frames = None
+
+
+def _worker_init():
+    # paralelizujeme přes procesy, OpenCV vlákna by se jen přetahovala o jádra
+    cv2.setNumThreads(1)
+
+
+def _worker_attach(name, slots, shape):
+    global _ring_name, _ring_shm, _ring_frames
+
+    if _ring_name == name:
+        return _ring_frames
+
+    if _ring_shm is not None:
+        _ring_frames = None
+        _ring_shm.close()
+
+    _ring_shm = shared_memory.SharedMemory(name=name)
+    _ring_frames = np.ndarray((slots,) + tuple(shape), np.uint8, buffer=_ring_shm.buf)
+    _ring_name = name
+    return _ring_frames
+
+
+def _worker_run(name, slots, shape, slot, fn, params):
+    frames = _worker_attach(name, slots, shape)
+
+    # kontext i ve workeru – převody barev se pak dají změřit zvlášť
+    ctx = FrameContext(frames[slot])
+    t0 = time.perf_counter()
+    result = fn(ctx, **params)
+    return slot, result, (time.perf_counter() - t0) * 1000.0, ctx.convert_ms
+
+
+# ============================================================
+#  POOL
+# ============================================================
+class PoolResult:
+    def __init__(self, seq, ts, frame, result, detect_ms, convert_ms=0.0):
+        self.seq = seq
+        self.ts = ts
+        self.frame = frame          # původní snímek, ne view do kruhu
+        self.result = result
+        self.detect_ms = detect_ms
+        self.convert_ms = convert_ms
+
+
+class VisionPool:
+    """Detekce ve více procesech. Snímky jdou přes FrameRing, výsledky po slotech v pořadí seq."""
+
+    def __init__(self, workers, log, slots=None):
+        self.workers = workers
+        self.log = log
+        self.slots = slots or workers * 2
+
+        self.ring = None
+        self.in_flight = collections.deque()
+        self._result_ready = asyncio.Event()
+
+        self.executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_worker_init,
+        )
+
+        # statistiky
+        self.submitted = 0
+        self.dropped = 0
+        self.completed = 0
+        self._latency_ms = collections.deque(maxlen=256)
+        self._done_times = collections.deque(maxlen=256)
+
+        self.log.info(f"VisionPool: {workers} workerů, {self.slots} slotů")
+
+    # ---------------------------------------------------------
+    def _ensure_ring(self, shape):
+        if self.ring is not None and self.ring.shape == shape:
+            return True
+
+        # kruh jde přestavět jen když v něm nic není
+        if self.in_flight:
+            return False
+
+        if self.ring is not None:
+            self.ring.close()
+        self.ring = FrameRing(self.slots, shape)
+        return True
+
+    def submit(self, fn, frame, ts, seq, params=None):
+        """Vloží snímek do kruhu a pošle ho workeru. Vrací False, když je kruh plný (snímek zahozen)."""
+        if not self._ensure_ring(frame.shape):
+            self.dropped += 1
+            return False
+
+        slot = self.ring.acquire()
+        if slot is None:
+            self.dropped += 1
+            return False
+
+        self.ring.frames[slot][...] = frame
+
+        fut = self.executor.submit(
+            _worker_run, self.ring.name, self.slots, self.ring.shape,
+            slot, fn, params or {},
+        )
+        afut = asyncio.wrap_future(fut)
+        afut.add_done_callback(lambda _: self._result_ready.set())
+
+        self.in_flight.append((seq, ts, frame, slot, afut))
+        self.submitted += 1
+        self._result_ready.set()
+        return True
+
+    def has_pending(self):
+        return bool(self.in_flight)
+
+    async def next_result(self):
+        """Vrátí nejstarší výsledek (pořadí podle seq), slot v kruhu se uvolní."""
+        while not self.in_flight or not self.in_flight[0][4].done():
+            self._result_ready.clear()
+            await self._result_ready.wait()
+
+        seq, ts, frame, slot, afut = self.in_flight.popleft()
+
+        # worker už slot dočetl, můžeme ho hned vrátit do kruhu
+        self.ring.release(slot)
+
+        try:
+            _, result, detect_ms, convert_ms = afut.result()
+        except asyncio.CancelledError:
+            return None
+        except Exception as e:
+            self.log.warn(f"VisionPool worker error: {e}")
+            return None
+
+        now = time.monotonic()
+        self.completed += 1
+        self._latency_ms.append((now - ts) * 1000.0)
+        self._done_times.append(now)
+
+        return PoolResult(seq, ts, frame, result, detect_ms, convert_ms)
+
+    # ---------------------------------------------------------
+    def stats(self):
+        fps = 0.0
+        if len(self._done_times) > 1:
+            span = self._done_times[-1] - self._done_times[0]
+            if span > 0:
+                fps = (len(self._done_times) - 1) / span
+
+        lat = sorted(self._latency_ms)
+        return {
+            "workers": self.workers,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "dropped": self.dropped,
+            "fps": fps,
+            "latency_ms_p50": lat[len(lat) // 2] if lat else None,
+            "latency_ms_max": lat[-1] if lat else None,
+        }
+
+    async def drain(self):
+        # počká na rozdělané úlohy, ať se sloty vrátí do kruhu
+        while self.in_flight:
+            await self.next_result()
+
+    def close(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        self.in_flight.clear()
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
+        self.log.info("VisionPool ukončen.")
@@ -1,45 +1,254 @@
 import socket
 import threading
 import cv2
-import numpy as np
 import http.server
-import socketserver
 import os
 import sys
+import time
+from urllib.parse import urlparse, parse_qs
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
-from ProgramManager.ports import PREVIEW_PORT
+from ProgramManager.ports import PREVIEW_PORT, PREVIEW_CTRL_PORT
 from LoggerManager.logger import Logger
+from preview_shm import PreviewReader
+from preview_protocol import PreviewReassembler
+from preview_demand import encode_request, merge_size
 
 log = Logger("WebPreview")
 
-latest_frame = None
+HTTP_PORT = 8081
+JPEG_QUALITY = 70
+DEFAULT_FPS = 30.0
+MAX_FPS = 60.0
+CLIENT_TIMEOUT = 5.0  # s – zaseklý klient nesmí držet vlákno navždy
+LOSS_REPORT_INTERVAL = 10.0  # s
+DEMAND_INTERVAL = 1.0  # s – obnova lease u CameraManageru
+SNAPSHOT_MAX_AGE = 1.0  # s – starší snímek z cache už není "aktuální"
+SNAPSHOT_TIMEOUT = 2.0  # s – čekání na čerstvý snímek, když nikdo nestreamuje
 
 
-def udp_receiver():
-    global latest_frame
+# ============================================================
+#  FRAME HUB – jeden snímek, jedno kódování, N klientů
+# ============================================================
+class FrameHub:
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.frame_id = 0
+        self.raw = None         # BGR ze sdílené paměti
+        self.jpg = None         # hotový JPEG
+        self.jpg_id = 0         # ke kterému frame_id patří jpg
+        self.frame_t = 0.0      # monotonic příchodu posledního snímku
+        self.clients = 0
+        self.requests = {}      # klient → (width, height, quality, fps)
+        # nový klient → demand_sender pošle lease hned, ne až po DEMAND_INTERVAL
+        self.demand_changed = threading.Event()
+
+    # ---------------- zdroje ----------------
+    def publish_raw(self, frame, ts=None):
+        # ts = čas snímku ze sdílené paměti – první čtení může vrátit dávno starý snímek
+        with self.cond:
+            self.raw = frame
+            self.frame_id += 1
+            self.frame_t = time.monotonic() if ts is None else ts
+            self.cond.notify_all()
+
+    def publish_jpeg(self, data):
+        # UDP zdroj už posílá JPEG – nedekódujeme, jen přepošleme
+        with self.cond:
+            self.raw = None
+            self.frame_id += 1
+            self.jpg = data
+            self.jpg_id = self.frame_id
+            self.frame_t = time.monotonic()
+            self.cond.notify_all()
+
+    def wait_for_clients(self):
+        with self.cond:
+            self.cond.wait_for(lambda: self.clients > 0)
+
+    # ---------------- klienti ----------------
+    def add_client(self, key, request):
+        with self.cond:
+            self.clients += 1
+            self.requests[key] = request
+            self.cond.notify_all()
+        self.demand_changed.set()
+
+    def remove_client(self, key):
+        with self.cond:
+            self.clients -= 1
+            self.requests.pop(key, None)
+
+    def demand(self):
+        """Sloučené požadavky klientů (max ze všech), nebo None bez klientů."""
+        with self.cond:
+            if not self.requests:
+                return None
+            reqs = list(self.requests.values())
+        width, height = (merge_size(r[i] for r in reqs) for i in (0, 1))
+        return (width, height, max(r[2] for r in reqs), max(r[3] for r in reqs))
+
+    def _encoded(self):
+        # volá se pod zámkem – kóduje se maximálně jednou na snímek
+        if self.jpg_id != self.frame_id and self.raw is not None:
+            quality = max((r[2] for r in self.requests.values()), default=JPEG_QUALITY)
+            ok, jpg = cv2.imencode(".jpg", self.raw, [cv2.IMWRITE_JPEG_QUALITY, quality])
+            if ok:
+                self.jpg = jpg.tobytes()
+                self.jpg_id = self.frame_id
+        return self.jpg
+
+    def fresh_jpeg(self, max_age, timeout=0.0):
+        """Počká max. timeout na snímek ne starší než max_age. Vrací jpeg nebo None."""
+        def fresh():
+            return self.frame_id > 0 and time.monotonic() - self.frame_t <= max_age
+
+        with self.cond:
+            if not self.cond.wait_for(fresh, timeout):
+                return None
+            return self._encoded()
+
+    def wait_jpeg(self, after_id, timeout):
+        """Počká na snímek novější než after_id a vrátí (jpeg, frame_id) nebo (None, after_id)."""
+        with self.cond:
+            if not self.cond.wait_for(lambda: self.frame_id > after_id, timeout):
+                return None, after_id
+            return self._encoded(), self.frame_id
+
 
+hub = FrameHub()
+
+
+# ============================================================
+#  ZDROJE SNÍMKŮ
+# ============================================================
+def udp_receiver():
     sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     sock.bind(("0.0.0.0", PREVIEW_PORT))
 
     log.info(f"Listening for preview frames on UDP {PREVIEW_PORT}")
 
+    reassembler = PreviewReassembler()
+    last_report = time.monotonic()
+    last_lost = 0
+
+    while True:
+        packet, _ = sock.recvfrom(65535)
+        if hub.clients == 0:
+            continue
+
+        done = reassembler.feed(packet)
+        if done is not None:
+            hub.publish_jpeg(done[2])
+
+        now = time.monotonic()
+        if now - last_report >= LOSS_REPORT_INTERVAL:
+            st = reassembler.stats()
+            if st["frames_lost"] > last_lost:
+                log.warn(
+                    f"Preview loss: {st['frames_lost'] - last_lost} frames "
+                    f"in {now - last_report:.0f} s (total {st['loss'] * 100:.1f} %)"
+                )
+            last_lost = st["frames_lost"]
+            last_report = now
+
+
+def demand_sender():
+    """Dokud se někdo dívá, obnovuje u CameraManageru poptávku po preview."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    addr = ("127.0.0.1", PREVIEW_CTRL_PORT)
+    active = False
+
     while True:
-        data, _ = sock.recvfrom(200000)
-        frame = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
-        if frame is not None:
-            latest_frame = frame
+        demand = hub.demand()
 
+        try:
+            if demand is not None:
+                width, height, quality, fps = demand
+                sock.sendto(encode_request("web_preview", width, height, quality, fps), addr)
+                active = True
+            elif active:
+                sock.sendto(encode_request("web_preview", ttl=0), addr)
+                active = False
+        except OSError as e:
+            log.warn(f"Preview demand send failed: {e}")
 
+        hub.demand_changed.wait(DEMAND_INTERVAL)
+        hub.demand_changed.clear()
+
+
+def shm_receiver():
+    """Raw snímky ze sdílené paměti – čteme jen když se někdo dívá."""
+    reader = PreviewReader()
+    log.info("Reading preview frames from shared memory")
+
+    while True:
+        if hub.clients == 0:
+            hub.wait_for_clients()
+
+        res = reader.read()
+        if res is None:
+            time.sleep(0.005)
+            continue
+
+        hub.publish_raw(res[0], res[2])
+
+
+# ============================================================
+#  HTTP
+# ============================================================
 class MJPEGHandler(http.server.BaseHTTPRequestHandler):
     def do_GET(self):
-        global latest_frame
+        url = urlparse(self.path)
 
-        if self.path != "/":
+        if url.path in ("/", "/stream"):
+            self._stream(parse_qs(url.query))
+        elif url.path == "/snapshot.jpg":
+            self._snapshot()
+        else:
             self.send_error(404)
+
+    def log_message(self, format, *args):
+        # BaseHTTPRequestHandler jinak spamuje stderr každým requestem
+        pass
+
+    def _snapshot(self):
+        # bez streamu se snímky nečtou ani nepoptávají – krátký lease na jeden snímek
+        jpg = hub.fresh_jpeg(SNAPSHOT_MAX_AGE)
+        if jpg is None:
+            key = object()
+            hub.add_client(key, (0, 0, JPEG_QUALITY, DEFAULT_FPS))
+            try:
+                jpg = hub.fresh_jpeg(SNAPSHOT_MAX_AGE, SNAPSHOT_TIMEOUT)
+            finally:
+                hub.remove_client(key)
+
+        if jpg is None:
+            self.send_error(503, "No frame")
             return
 
+        self.send_response(200)
+        self.send_header("Cache-Control", "no-cache, private")
+        self.send_header("Content-Type", "image/jpeg")
+        self.send_header("Content-Length", str(len(jpg)))
+        self.end_headers()
+        self.wfile.write(jpg)
+
+    def _stream(self, query):
+        # ?fps=15&w=640&h=480&q=80 – rozlišení a kvalitu dělá rovnou CameraManager
+        try:
+            fps = max(0.1, min(float(query.get("fps", [DEFAULT_FPS])[0]), MAX_FPS))
+            width = int(query.get("w", [0])[0])
+            height = int(query.get("h", [0])[0])
+            quality = int(query.get("q", [JPEG_QUALITY])[0])
+        except ValueError:
+            self.send_error(400, "Bad query")
+            return
+        period = 1.0 / fps
+
+        self.connection.settimeout(CLIENT_TIMEOUT)
+
         self.send_response(200)
         self.send_header("Age", "0")
         self.send_header("Cache-Control", "no-cache, private")
@@ -47,34 +256,63 @@ class MJPEGHandler(http.server.BaseHTTPRequestHandler):
         self.send_header("Content-Type", "multipart/x-mixed-replace; boundary=FRAME")
         self.end_headers()
 
-        log.info("HTTP client connected")
+        key = object()
+        hub.add_client(key, (width, height, quality, fps))
+        log.info(f"HTTP client connected ({self.client_address[0]}, {1.0 / period:.0f} fps)")
 
-        while True:
-            if latest_frame is None:
-                continue
+        last_id = 0
+        next_due = 0.0
 
-            ret, jpg = cv2.imencode(".jpg", latest_frame)
-            if not ret:
-                continue
+        try:
+            while True:
+                # tempo klienta – mezitím došlé snímky se zahodí, bere se vždy nejnovější
+                delay = next_due - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
 
-            try:
-                self.wfile.write(b"--FRAME\r\n")
-                self.wfile.write(b"Content-Type: image/jpeg\r\n\r\n")
-                self.wfile.write(jpg.tobytes())
-                self.wfile.write(b"\r\n")
-            except BrokenPipeError:
-                log.info("HTTP client disconnected")
-                break
+                jpg, frame_id = hub.wait_jpeg(last_id, CLIENT_TIMEOUT)
+                if jpg is None:
+                    # bez snímků se nic nezapisuje – mrtvý klient by držel lease navždy
+                    self._keep_alive()
+                    continue
+
+                next_due = time.monotonic() + period
+                last_id = frame_id
+
+                self.wfile.write(
+                    b"--FRAME\r\n"
+                    b"Content-Type: image/jpeg\r\n"
+                    + f"Content-Length: {len(jpg)}\r\n\r\n".encode()
+                    + jpg
+                    + b"\r\n"
+                )
+        except (BrokenPipeError, ConnectionResetError, socket.timeout):
+            log.info("HTTP client disconnected")
+        finally:
+            hub.remove_client(key)
+
+    def _keep_alive(self):
+        # zavřené spojení = recv vrátí b"" hned, bez čekání na chybu zápisu
+        try:
+            if self.connection.recv(1, socket.MSG_PEEK | socket.MSG_DONTWAIT) == b"":
+                raise ConnectionResetError("client closed")
+        except BlockingIOError:
+            pass
+        # prázdný řádek mezi díly multipart prohlížeč ignoruje, RST se ale projeví
+        self.wfile.write(b"\r\n")
 
 
 def start_http_server():
-    PORT = 8081
-    log.info(f"Starting MJPEG server on {PORT}")
+    log.info(f"Starting MJPEG server on {HTTP_PORT}")
 
-    with socketserver.TCPServer(("", PORT), MJPEGHandler) as httpd:
+    httpd = http.server.ThreadingHTTPServer(("", HTTP_PORT), MJPEGHandler)
+    httpd.daemon_threads = True
+    with httpd:
         httpd.serve_forever()
 
 
 if __name__ == "__main__":
     threading.Thread(target=udp_receiver, daemon=True).start()
+    threading.Thread(target=shm_receiver, daemon=True).start()
+    threading.Thread(target=demand_sender, daemon=True).start()
     start_http_server()
@@ -3,6 +3,8 @@ ROBORIO_IP = "10.69.69.2"
 CAMERA_DATA_PORT = 5800
 PROGRAM_SELECT_PORT = 5801
 PREVIEW_PORT = 5802
+PREVIEW_CTRL_PORT = 5803
+CLOCK_SYNC_PORT = 5804
 
 LED_STRIP_PORT = 5810
 